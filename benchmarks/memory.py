@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+'''
+Measures how much memory a journal of N articles takes.
+
+Builds synthetic ADS search results (detail profile, so including an
+abstract and a reference list drawn from a shared pool of papers) and
+compares the raw docs, as articles used to hold them, against a journal
+built from them once the raw docs are gone.
+
+python benchmarks/memory.py [N ...]
+'''
+
+import gc
+import os
+import sys
+import random
+import string
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyastroref.papers import adsabs, articles
+
+
+def make_docs(num, num_refs=40, seed=1):
+    rng = random.Random(seed)
+    stems = ['ApJ', 'MNRAS', 'A&A', 'ApJS', 'Natur', 'Sci', 'AJ', 'PASP']
+    bibcodes = ['{}{:.<5}{:.>4}.{:.>4}A'.format(2000+i%24, stems[i%len(stems)], i//10000, i%10000)
+                for i in range(num)]
+
+    docs = []
+    for i, bibcode in enumerate(bibcodes):
+        docs.append({
+            'bibcode': bibcode,
+            'title': ['A study of ' + ''.join(rng.choices(string.ascii_lowercase + ' ', k=60))],
+            'author': ['Author{}, A.'.format(rng.randint(0, 5000)) for _ in range(rng.randint(1, 8))],
+            'year': str(2000 + i%24),
+            'bibstem': [stems[i%len(stems)]],
+            'citation_count': rng.randint(0, 500),
+            '[citations]': {'num_references': num_refs, 'num_citations': 0},
+            'abstract': ''.join(rng.choices(string.ascii_lowercase + ' ', k=1000)),
+            'pubdate': '{}-01-00'.format(2000 + i%24),
+            'alternate_bibcode': [],
+            'identifier': [bibcode],
+            # Papers cite each other so references repeat between articles,
+            # but as parsed from json each one is a seperate string
+            'reference': [j[:1] + j[1:] for j in rng.sample(bibcodes, min(num_refs, num))],
+        })
+    return docs
+
+
+def measure(num):
+    '''
+    Returns the memory (bytes) held by the raw ADS docs for num articles
+    (what each article used to keep) and by a journal built from them
+    '''
+    adsdata = adsabs.adsabs()
+    # Start each size with an empty bibcode id table
+    articles._bibcode_ids = articles._ids()
+
+    tracemalloc.start()
+    docs = make_docs(num)
+    gc.collect()
+    size_raw, _ = tracemalloc.get_traced_memory()
+
+    j = articles.journal(adsdata, [i['bibcode'] for i in docs], data=docs,
+                        fields=articles._profiles['detail'])
+    del docs
+    gc.collect()
+    size_journal, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del j
+    return size_raw, size_journal
+
+
+def main(sizes):
+    print('{:>8} {:>12} {:>12} {:>14}'.format('articles', 'raw docs MB', 'journal MB', 'per article B'))
+    for num in sizes:
+        size_raw, size_journal = measure(num)
+        print('{:>8} {:>12.1f} {:>12.1f} {:>14.0f}'.format(num, size_raw/1e6, size_journal/1e6,
+                                                         size_journal/num))
+
+
+if __name__ == "__main__":
+    sizes = [int(i) for i in sys.argv[1:]] or [10000, 50000, 100000]
+    main(sizes)
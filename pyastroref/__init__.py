@@ -1,4 +1,4 @@
-from . import pyastroref
-
 def main():
+    # Imported here so the papers package can be used without Gtk
+    from . import pyastroref
     pyastroref.main()
\ No newline at end of file
@@ -10,10 +10,44 @@ from pathlib import Path
 from . import utils
 from . import articles
 from . import libraries
+from . import cache
+from . import ratelimit
+from . import graph
+from . import offline
+from . import pdfstore
+from . import snapshots
+from . import writes
 
 # How many queries left today
-_max_limit = 5000
-_limit = 5000
+_limits = ratelimit.governor()
+
+# Shared connection pool for every adsabs instance
+_session = None
+
+# Shared on disk metadata cache for every adsabs instance
+_cache = None
+
+# Shared local citation graph
+_graph = None
+
+# Shared offline search index over the metadata cache
+_offline = None
+
+# Shared index of the PDF folder
+_pdfs = None
+
+# Shared local copies of ADS libraries
+_snapshots = None
+
+# Shared queue of library changes waiting to go to ADS
+_writes = None
+
+# Identical requests in flight at the same time share one call
+_inflight = utils.SingleFlight()
+
+# One auth for every request, kept up to date when the token changes
+_auth = utils.BearerAuth(None)
+utils.config.watch('TOKEN_FILE', lambda token: setattr(_auth, 'token', token))
 
 
 class adsabs(object):
@@ -26,29 +60,136 @@ class adsabs(object):
         self._libs = None
         self.search_source = None
 
+    @property
+    def session(self):
+        '''
+        Returns the shared, connection pooling, http session
+        '''
+        global _session
+        if _session is None:
+            _session = utils.ADSSession(limits=_limits)
+        return _session
+
+    @property
+    def inflight(self):
+        '''
+        Returns the shared single-flight request coalescer
+        '''
+        return _inflight
+
+    @property
+    def limits(self):
+        '''
+        Returns the process wide ADS quota governor
+        '''
+        return _limits
+
+    @property
+    def limit_remaining(self):
+        '''
+        Number of ADS api calls left before the quota resets
+        '''
+        return _limits.remaining
+
+    @property
+    def limit_reset(self):
+        '''
+        When the ADS quota resets (datetime) or None if we dont know yet
+        '''
+        return _limits.reset
+
+    @property
+    def cache(self):
+        '''
+        Returns the shared on disk article metadata cache
+        '''
+        global _cache
+        if _cache is None:
+            _cache = cache.metadata()
+        return _cache
+
+    @property
+    def graph(self):
+        '''
+        Returns the shared local citation graph
+        '''
+        global _graph
+        if _graph is None:
+            _graph = graph.graph()
+        return _graph
+
+    @property
+    def offline(self):
+        '''
+        Returns the shared offline full text search engine
+        '''
+        global _offline
+        if _offline is None:
+            _offline = offline.engine()
+        return _offline
+
+    @property
+    def pdfs(self):
+        '''
+        Returns the shared PDF store
+        '''
+        global _pdfs
+        if _pdfs is None:
+            _pdfs = pdfstore.store()
+        return _pdfs
+
+    @property
+    def snapshots(self):
+        '''
+        Returns the shared local copies of ADS libraries
+        '''
+        global _snapshots
+        if _snapshots is None:
+            _snapshots = snapshots.snapshots()
+        return _snapshots
+
+    @property
+    def writes(self):
+        '''
+        Returns the shared queue of library changes
+        '''
+        global _writes
+        if _writes is None:
+            _writes = writes.queue(self)
+        return _writes
+
+    @property
+    def auth(self):
+        '''
+        Returns the shared requests auth carrying the ADS token
+        '''
+        if _auth.token is None:
+            _auth.token = self.token
+        return _auth
+
     @property
     def token(self):
-        return utils.read_key_file(self.settings['TOKEN_FILE'])
+        return utils.config.get('TOKEN_FILE')
 
     @token.setter
     def token(self, token):
-        utils.save_key_file(self.settings['TOKEN_FILE'],token)
+        utils.config.set('TOKEN_FILE',token)
         
     @property
     def orcid(self):
-        return utils.read_key_file(self.settings['ORCID_FILE'])
+        return utils.config.get('ORCID_FILE')
 
     @orcid.setter
     def orcid(self, orcid):
-        utils.save_key_file(self.settings['ORCID_FILE'],orcid)
+        utils.config.set('ORCID_FILE',orcid)
 
     @property
     def pdffolder(self):
-        return utils.read_key_file(self.settings['PDFFOLDER_FILE'])
+        return utils.config.get('PDFFOLDER_FILE')
 
     @pdffolder.setter
     def pdffolder(self, pdffolder):
-        utils.save_key_file(self.settings['PDFFOLDER_FILE'],pdffolder)
+        utils.config.set('PDFFOLDER_FILE',pdffolder)
 
     def __getattr__(self, key):
         if key == 'libraries':
@@ -72,3 +213,11 @@ class adsabs(object):
         s = articles.search(self)
         return s.search(query)
 
+    def stream(self, query):
+        '''
+        Like search() but yields articles as each page of results arrives
+
+        Returns a stream, which has num_found set before the first article is yielded
+        '''
+        s = articles.search(self)
+        return s.stream(query)
@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import asyncio
+import functools
+import threading
+import concurrent.futures
+
+from . import articles
+
+# Maximum number of blocking network calls running at once
+_max_workers = 8
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers)
+
+# The event loop that the ui hands coroutines to, see loop()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+async def run(func, *args, **kwargs):
+    '''
+    Runs the blocking func(*args, **kwargs) without blocking the event loop.
+
+    All the network calls still go through the shared pooled session
+    (adsabs.session) so they share connections, the cache and the
+    rate-limit governor with the synchronous api.
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def loop():
+    '''
+    Returns a long lived event loop running in its own thread.
+
+    Coroutines can be handed to it from any thread with
+    asyncio.run_coroutine_threadsafe(coro, loop())
+    '''
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever)
+            thread.daemon = True
+            thread.start()
+    return _loop
+
+
+def submit(coro):
+    '''
+    Schedules coro on loop(), returns a concurrent.futures.Future
+    '''
+    return asyncio.run_coroutine_threadsafe(coro, loop())
+
+
+class client(object):
+    '''
+    asyncio versions of the papers api.
+
+    Each call is a coroutine so many searches, library updates and pdf
+    downloads can be awaited together (asyncio.gather) from one event
+    loop. They wrap the synchronous api, so share its planner, caching
+    and single-flight coalescing.
+    '''
+    def __init__(self, adsdata):
+        self.adsdata = adsdata
+
+    async def search(self, query, profile='list'):
+        # The sync search does the planning, coalescing and paging (in parallel)
+        s = articles.search(self.adsdata, profile=profile)
+        return await run(s.search, query)
+
+    async def chunked_search(self, ids, prefix, profile='list'):
+        s = articles.search(self.adsdata, profile=profile)
+        return await run(s.chunked_search, list(ids), prefix)
+
+    async def bibcode_multi(self, bibcodes):
+        return await self.chunked_search(bibcodes,'bibcode:')
+
+    async def arxiv_multi(self, arxivids):
+        return await self.chunked_search(arxivids,'identifier:')
+
+    async def library_update(self, library):
+        await run(library.update)
+        return library
+
+    async def pdf(self, article, filename):
+        return await run(article.pdf, filename)
@@ -2,21 +2,43 @@
 
 import os
 import re
+import sys
+import array
+import threading
 import requests
 import datetime
+import concurrent.futures
+import urllib.parse
 from pathlib import Path
 
 import bibtexparser
 from bibtexparser.bparser import BibTexParser
 
 from . import utils
-
+from . import table
+from . import offline
+from . import planner
+from . import download
+
+
+# Named sets of ADS search fields.
+# 'list' is what showing an article as a row in a tab needs, including
+# the abstract (tooltips, tab search), identifiers (arXiv link) and
+# alternate bibcodes (finding its PDF saved under another bibcode) so the
+# ui never has to go back to ADS from the main loop,
+# 'detail' adds the large fields (reference list) that are
+# fetched when an article's properties first need them.
+_profiles = {
+    'list': ['bibcode','title','author','year','bibstem','citation_count','[citations]',
+            'abstract','identifier','alternate_bibcode'],
+}
+_profiles['detail'] = _profiles['list'] + ['pubdate','reference']
+
+# Fields that list the other ids (ie bibcodes) an article is known by
+_alias_fields = ['alternate_bibcode','identifier']
 
 # Default ADS search fields
-_fields = ['bibcode','title','author','year','abstract',
-            'pubdate','bibstem','alternate_bibcode','citation_count','identifier',
-            'reference'
-            ]
+_fields = _profiles['detail']
 
 search_words = '''abs abstract ack aff aff_id alternate_bibcode alternative_title arXiv arxiv_class author author_count
                  bibcode bigroup bibstem body 
@@ -35,6 +57,90 @@ search_words = '''abs abstract ack aff aff_id alternate_bibcode alternative_titl
                  year
                 '''.split()
 
+# Number of rows ADS returns per page
+_rows = 100
+
+# Default maximum number of rows to fetch for a single query, each page
+# of _rows costs one ADS query so pass a larger max_rows to search() to
+# ask for more
+_max_rows = 250
+
+# Maximum number of pages to download at once
+_max_workers = 4
+
+# Maximum number of articles in a journal to fetch missing fields for at once
+_batch = 100
+
+# Maximum number of bibcodes to send to the export api at once
+_export_rows = 500
+
+# There are multiple possible locations for the pdf. The journal link
+# usally needs a vpn working to use a university ip address, so fall
+# back to the arXiv and ADS mirrors
+_pdf_sources = ['/PUB_PDF', '/EPRINT_PDF', '/ADS_PDF']
+
+
+class _ids(object):
+    '''
+    Maps bibcodes to small integers (and back) so that reference lists
+    can be stored as compact arrays, shared by every article
+    '''
+    __slots__ = ('_ids', '_names', '_lock')
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def encode(self, bibcodes):
+        with self._lock:
+            result = array.array('l')
+            for i in bibcodes:
+                idx = self._ids.get(i)
+                if idx is None:
+                    idx = len(self._names)
+                    i = sys.intern(i)
+                    self._ids[i] = idx
+                    self._names.append(i)
+                result.append(idx)
+        return result
+
+    def decode(self, ids):
+        return [self._names[i] for i in ids]
+
+_bibcode_ids = _ids()
+
+# Articles share one frozenset per distinct set of fields
+_fieldsets = {}
+
+
+def _fieldset(fields):
+    fields = frozenset(fields)
+    return _fieldsets.setdefault(fields, fields)
+
+
+def _compact(data):
+    '''
+    Returns a copy of an ADS doc that takes less memory: bibcodes and
+    bibstems are interned and the reference list becomes an array of ids
+    '''
+    data = dict(data)
+    if 'bibcode' in data:
+        data['bibcode'] = sys.intern(data['bibcode'])
+    if 'bibstem' in data:
+        data['bibstem'] = [sys.intern(i) for i in data['bibstem']]
+    if 'year' in data:
+        data['year'] = sys.intern(data['year'])
+    if 'reference' in data and not isinstance(data['reference'], array.array):
+        data['reference'] = _bibcode_ids.encode(data['reference'])
+    return data
+
+
+def _expand(key, value):
+    # Undoes _compact for a single field
+    if key == 'reference' and isinstance(value, array.array):
+        return _bibcode_ids.decode(value)
+    return value
 
 
 class journal(object):
@@ -43,15 +149,23 @@ class journal(object):
 
     We defer as much as possible actualy accessing data untill its needed
     '''
-    def __init__(self, adsdata, bibcodes, data=None):
+    __slots__ = ('adsdata', '_set_bibcodes', '_bibcodes', '_data', 'fields', '_columns',
+                '__weakref__')
+
+    def __init__(self, adsdata, bibcodes, data=None, fields=None):
         self.adsdata = adsdata
-        self._set_bibcodes = set(bibcodes)   
-        self._bibcodes = bibcodes    
+        self._bibcodes = [sys.intern(i) for i in bibcodes]
+        self._set_bibcodes = set(self._bibcodes)
         self._data = {}
+        self._columns = None
+        if fields is None:
+            fields = _profiles['list']
+        self.fields = fields
 
         if data is not None:
             for i in data:
-                self._data[i['bibcode']] = article(self.adsdata, i['bibcode'], data=i)
+                a = article(self.adsdata, data=i, fields=self.fields, group=self)
+                self._data[a.bibcode] = a
 
     def __len__(self):
         return len(self._set_bibcodes)
@@ -62,20 +176,104 @@ class journal(object):
     def __getitem__(self, key):
         if key in self._set_bibcodes:
             if key not in self._data:
-                self._data[key] = article(self.adsdata,bibcode=key)
+                self._data[key] = article(self.adsdata,bibcode=key,
+                                    data=self.adsdata.cache.get(key,self.fields),
+                                    fields=self.fields, group=self)
             return self._data[key]
         else:
             return self.__getitem__(self._bibcodes[key])
 
     def __iter__(self):
+        self.prefetch()
         for i in self._bibcodes:
             yield self.__getitem__(i)
 
+    def prefetch(self):
+        '''
+        Fetches the data for every article we dont have yet.
+
+        Uses batched bibcode searches (and the cache) so this costs at most
+        one ADS query per 20 missing articles, rather than one each.
+        '''
+        missing = [i for i in self._bibcodes if i not in self._data]
+        if not len(missing):
+            return
+
+        found = search(self.adsdata, fields=self.fields).fetch(missing)
+        for i in missing:
+            if i in found:
+                self._data[i] = article(self.adsdata, bibcode=i, data=found[i],
+                                        fields=self.fields, group=self)
+
+        # ADS does not know these, drop them rather than show empty rows
+        gone = {i for i in missing if i not in found}
+        if len(gone):
+            self._bibcodes = [i for i in self._bibcodes if i not in gone]
+            self._set_bibcodes -= gone
+            self._columns = None
+
+    def fetch(self, fields, first=None):
+        '''
+        Fetches fields for up to _batch of our articles that dont have them yet.
+
+        Called by an article (first) when one of its properties needs a field
+        it doesn't have, so that its neighbours get filled in with the same
+        queries.
+        '''
+        todo = []
+        if first is not None:
+            todo.append(first)
+
+        for i in self._bibcodes:
+            if len(todo) >= _batch:
+                break
+            a = self._data.get(i)
+            if a is not None and a is not first and not a.has(fields):
+                todo.append(a)
+
+        found = search(self.adsdata, fields=fields).fetch([i.bibcode for i in todo])
+        for i in todo:
+            i.update(found.get(i.bibcode, {}), fields)
+
+    def extend(self, docs):
+        '''
+        Adds the articles in docs (as returned by ADS) to the end of the
+        journal and returns them
+        '''
+        self._columns = None
+        new = []
+        for i in docs:
+            a = article(self.adsdata, data=i, fields=self.fields, group=self)
+            if a.bibcode not in self._set_bibcodes:
+                self._bibcodes.append(a.bibcode)
+                self._set_bibcodes.add(a.bibcode)
+            self._data[a.bibcode] = a
+            new.append(a)
+        return new
+
+    def columns(self):
+        '''
+        Returns a table.columns view of the journal (in order) for
+        vectorized sorting and filtering, indices refer to self[i]
+        '''
+        if self._columns is None:
+            self._columns = table.columns(self)
+        return self._columns
+
     def keys(self):
         return self._set_bibcodes
 
     def bibcodes(self):
-        return self.keys()
+        '''
+        Returns the bibcodes, in order
+        '''
+        return list(self._bibcodes)
+
+    def bibtex(self):
+        '''
+        Returns the bibtex for every article, in order
+        '''
+        return search(self.adsdata).bibtex(self._bibcodes)
 
     def values(self):
         return self._data.values()
@@ -92,24 +290,83 @@ class article(object):
     We defer actually searching the ads untill the user asks for a field.
     Thus we can make as many article as we want (if we allready know the bibcode)
     without hitting the ADS api limits.
+
+    fields lists which ADS fields data holds, anything else is fetched when
+    first needed (along with the rest of group, the journal we belong to).
     '''
+    __slots__ = ('adsdata', '_bibcode', '_data', '_fields', '_group',
+                '_citations', '_references', 'which_file', '__weakref__')
 
-    def __init__(self, adsdata, bibcode=None, data=None):
+    def __init__(self, adsdata, bibcode=None, data=None, fields=None, group=None):
         self.adsdata = adsdata
         self._bibcode = bibcode
         self._data = None
+        self._fields = _fieldset([])
+        self._group = group
         self._citations=None
         self._references=None
         self.which_file=None
 
+        if bibcode is not None:
+            self._bibcode = sys.intern(bibcode)
+
         if data is not None:
-            self._data = data
+            if fields is None:
+                fields = _fields
+            self._data = _compact(data)
+            self._fields = _fieldset(fields)
             self._bibcode = self._data['bibcode']
-    
-    def search(self,force=False):
-        if self._data is None or force:
-            self._data = self.adsdata.search.bibcode_single(self.bibcode)
-            
+
+    def search(self,force=False,fields=None):
+        '''
+        Fetches fields (default the list profile) for this article, using the cache if we can
+        '''
+        if fields is None:
+            fields = _profiles['list']
+
+        if not force:
+            fields = [i for i in fields if i not in self._fields]
+            if not len(fields):
+                return
+
+        found = search(self.adsdata, fields=fields).fetch([self.bibcode], force=force)
+        self.update(found.get(self.bibcode, {}), fields)
+
+    def update(self, data, fields):
+        '''
+        Merges in data, which holds fields (ADS leaves out empty ones).
+
+        If data is empty ADS did not send us this article so nothing is
+        marked as loaded, letting the next access try again.
+        '''
+        if not len(data):
+            return
+        if self._data is None:
+            self._data = {}
+        self._data.update(_compact(data))
+        self._fields = _fieldset(self._fields.union(fields))
+
+    def has(self, fields):
+        return all(i in self._fields for i in fields)
+
+    def peek(self, key, default=None):
+        '''
+        Returns key if we have it allready, without going to ADS
+        '''
+        if self._data is None:
+            return default
+        return _expand(key, self._data.get(key, default))
+
+    def _need(self, fields):
+        if self.has(fields):
+            return
+
+        if self._group is not None:
+            self._group.fetch(fields, first=self)
+
+        if not self.has(fields):
+            self.search(fields=fields)
+
     @property
     def bibcode(self):
         return self._bibcode
@@ -123,23 +380,20 @@ class article(object):
                 return self._data[key]
 
     def __getitem__(self, key):
-        if self._data is None:
-            self.search()
+        self._need([key])
     
         if self._data is not None:
             if key in self._data:
-                return self._data[key]
+                return _expand(key, self._data[key])
 
     @property
     def title(self):
-        if self._data is None:
-            self.search()
+        self._need(_profiles['list'])
         return self._data['title'][0]
 
     @property
     def authors(self):
-        if self._data is None:
-            self.search()
+        self._need(_profiles['list'])
         return  '; '.join(self._data['author'])
 
     @property
@@ -148,33 +402,32 @@ class article(object):
 
     @property
     def first_author(self):
-        if self._data is None:
-            self.search()
+        self._need(_profiles['list'])
         return self._data['author'][0]
 
     @property
     def journal(self):
-        if self._data is None:
-            self.search()
+        self._need(_profiles['list'])
         return self._data['bibstem'][0]
 
     def filename(self, full=False):
         if full:
-            return os.path.join(utils.read_key_file(utils.settings['PDFFOLDER_FILE']),
-                                self.bibcode+'.pdf')
+            # We may allready have it under an alternate bibcode
+            found = self.adsdata.pdfs.find(self.bibcode, self.peek('alternate_bibcode', []))
+            if found is not None:
+                return found
+            return self.adsdata.pdfs.path(self.bibcode)
         else:
             return self.bibcode+'.pdf'
 
     @property
     def year(self):
-        if self._data is None:
-            self.search()
+        self._need(_profiles['list'])
         return self._data['year']
 
     @property
     def abstract(self):
-        if self._data is None:
-            self.search()
+        self._need(['abstract'])
         if 'abstract' in self._data:
             return self._data['abstract']
         else:
@@ -182,22 +435,17 @@ class article(object):
 
     @property
     def name(self):
-        if self._data is None:
-            self.search()
         return self.first_author + ' ' + self.year
 
     @property
     def ads_url(self):
-        if self._data is None:
-            self.search()
         return 'https://ui.adsabs.harvard.edu/abs/'+self.bibcode
 
     @property
     def arxiv_url(self):
-        if self._data is None:
-            self.search()
+        self._need(['identifier'])
         arxiv_id = None
-        for i in self._data['identifier']:
+        for i in self._data.get('identifier',[]):
             if i.startswith('arXiv:'):
                 arxiv_id = i.replace('arXiv:','')
 
@@ -208,10 +456,9 @@ class article(object):
 
     @property
     def journal_url(self):
-        if self._data is None:
-            self.search()
+        self._need(['identifier'])
         doi = None
-        for i in self._data['identifier']:
+        for i in self._data.get('identifier',[]):
             if i.startswith('10.'):
                 doi = i
         if doi is not None:
@@ -221,8 +468,7 @@ class article(object):
 
     @property
     def citation_count(self):
-        if self._data is None:
-            self.search()
+        self._need(_profiles['list'])
         if 'citation_count' not in self._data:
             return 0
         else:
@@ -230,66 +476,80 @@ class article(object):
 
     @property
     def reference_count(self):
-        if self._data is None:
-            self.search()
-        if 'reference' not in self._data:
-            return 0
-        else:
-            return len(self._data['reference'])
-    
-    def pdf(self, filename):
-        # There are multiple possible locations for the pdf
-        # Try to avoid the journal links as that usally needs a 
-        # vpn working to use a university ip address
-        strs = ['/PUB_PDF','/EPRINT_PDF','/ADS_PDF']
+        # Use the full reference list if we have it, otherwise the count
+        if 'reference' in self._fields:
+            return len(self._data.get('reference',[]))
 
+        self._need(_profiles['list'])
+        return self._data.get('[citations]',{}).get('num_references',0)
+
+    def pdf(self, filename, race=True, hosts=None):
+        '''
+        Downloads the PDF to filename.
+
+        Tries the publisher first then the arXiv and ADS mirrors, either
+        one after the other or (if race) both at once, keeping whichever
+        finishes first. hosts (a download.hosts) limits how hard we hit
+        each server. Anyone asking for the same file while we download
+        it waits for our copy, except that someone opening the paper never
+        waits on a background download (see prefetch), they get their own.
+
+        Returns the path of the PDF, which is an existing copy if we
+        allready had the same file under another name.
+        '''
         if os.path.exists(filename):
-            return
+            return filename
 
-        got_file=False
-        for i in strs:
-            url = utils.urls['pdfs']+str(self.bibcode)+i
+        if self.adsdata.limits.is_background():
+            key, tag = ('pdf', filename, 'background'), '.background'
+        else:
+            key, tag = ('pdf', filename), ''
+        filename = self.adsdata.inflight.do(key, self._pdf, filename, race, hosts, tag)
 
-            # Pretend to be Firefox otherwise we hit captchas
-            headers = {'user-agent': 'Mozilla /5.0 (Windows NT 10.0; Win64; x64)'}
-            try:
-                r = requests.get(url, allow_redirects=True,headers=headers)
-            except:
-                continue
+        if filename is None or not os.path.exists(filename):
+            raise utils.FileDonwnloadFailed("Couldn't download file")
+        return filename
 
-            if r.content.startswith(b'<!DOCTYPE html'): 
-                continue
+    def _pdf(self, filename, race, hosts, tag=''):
+        d = download.downloader(self.adsdata.session, hosts=hosts, tag=tag)
+        urls = {i:utils.urls['pdfs']+str(self.bibcode)+i for i in _pdf_sources}
 
-            with open(filename,'wb') as f:
-                f.write(r.content)
-                self.which_file = i
-                got_file=True
-                break
+        publisher = _pdf_sources[0]
+        if d.fetch(urls.pop(publisher), filename):
+            self.which_file = publisher
+        elif race:
+            self.which_file = d.race(urls, filename)
+        else:
+            for i, url in urls.items():
+                if d.fetch(url, filename):
+                    self.which_file = i
+                    break
 
         if not os.path.exists(filename):
-            raise utils.FileDonwnloadFailed("Couldn't download file")
+            return None
+        return self.adsdata.pdfs.add(filename, [self.bibcode] + list(self.peek('alternate_bibcode', [])))
 
     def citations(self):
         if self._citations is None:
-            self._citations = self.adsdata.search('citations(bibcode:"'+self._bibcode+'")')
+            # If we allready know about every citing paper we dont need to ask ADS
+            cites = self.adsdata.graph.citations(self.bibcode)
+            if len(cites) and len(cites) >= self.citation_count:
+                self._citations = search(self.adsdata).bibcode_multi(cites)
+            else:
+                self._citations = self.adsdata.search('citations(bibcode:"'+self._bibcode+'")')
         return self._citations
 
     def references(self):
         if self._references is None:
-            self._references = self.adsdata.search('references(bibcode:"'+self._bibcode+'")')
+            refs = self.adsdata.graph.references(self.bibcode)
+            if refs is None:
+                # Only the reference list is missing, fetching it fills in the graph
+                refs = self['reference'] or []
+            self._references = search(self.adsdata).bibcode_multi(refs)
         return self._references 
 
     def bibtex(self):
-        data = {'bibcode':[self.bibcode]}
-        r = requests.post(utils.urls['bibtex'],
-                auth=utils.BearerAuth(self.adsdata.token),
-                headers={'Content-Type':'application/json'},
-                json = data).json()
-
-        if 'error' in r:
-            raise ValueError(r['error'])
-
-        return r['export']
+        return search(self.adsdata).bibtex([self.bibcode])
 
     def __str__(self):
         return self.name
@@ -308,66 +568,157 @@ class article(object):
 
 
 class search(object):
-    def __init__(self, adsdata):
+    '''
+    Searches ADS, asking for the fields in profile (see _profiles) or
+    for an explicit list of fields
+    '''
+    def __init__(self, adsdata, max_rows=_max_rows, profile='list', fields=None):
         self.adsdata = adsdata
+        self.max_rows = max_rows
+        if fields is None:
+            fields = _profiles[profile]
+        if 'bibcode' not in fields:
+            fields = ['bibcode'] + list(fields)
+        self.fields = fields
 
     def search(self, query):
         if not len(query):
             return []
 
         # Parse search function
-        q = parseSearch(query)
-        
-        bibs, data = self._query(q.query())
-        return journal(self.adsdata,bibs,data=data)
+        q = parseSearch(query).query()
 
-    def _query(self, query, max_rows=250):
+        terms = planner.parse(q)
+        if terms is not None:
+            # Look ups by id can mostly be answered locally
+            bibs, data = planner.planner(self).run(terms)
+        else:
+            bibs, data = self._query(q)
+        return journal(self.adsdata,bibs,data=data,fields=self.fields)
 
-        start = 0
-        results = []
-        while True:
-            r = self._query_ads(query,start)
+    def stream(self, query):
+        '''
+        Like search() but returns a stream that yields articles as each
+        page arrives from ADS
+        '''
+        if not len(query):
+            return stream(self.adsdata, iter([]), self.fields)
 
-            # Did we get everything?
-            data = r.json()
+        q = parseSearch(query).query()
 
-            if 'response' not in data:
-                raise SearchError()
+        terms = planner.parse(q)
+        if terms is not None:
+            return stream(self.adsdata, self._iter_planned(terms), self.fields)
 
-            results.extend(data['response']['docs'])
-            num_found = int(data['response']['numFound'])
-            num_got = len(results)
+        return stream(self.adsdata, self._iter_pages(q), self.fields)
 
-            if num_got >= num_found:
-                break
+    def _iter_planned(self, terms):
+        # The planner answers in one go, so as one page
+        _, data = planner.planner(self).run(terms)
+        yield len(data), data
 
-            if num_got > max_rows:
-                break
+    def local(self, query):
+        '''
+        Answers query from the metadata cache alone, without asking ADS.
 
-            start = num_got
+        Stale cached data is used as is. Returns None if the query uses
+        syntax the offline engine does not understand (including urls
+        that need their page downloading to work out the paper).
+        '''
+        if not len(query):
+            return []
+
+        q = parseSearch(query, remote=False)
+        bibs = self.adsdata.offline.search(q.query(), max_rows=self.max_rows)
+        if bibs is None:
+            return None
+
+        found = self.adsdata.cache.get_many(bibs,self.fields,stale=True)
+        bibs = [i for i in bibs if i in found]
+        return journal(self.adsdata,bibs,data=[found[i] for i in bibs],fields=self.fields)
+
+    def _query(self, query, max_rows=None):
+        '''
+        Fetches up to max_rows results for query.
+
+        Concurrent callers making the same query share one set of requests
+        and one result (so treat the returned lists as read only).
+        '''
+        if max_rows is None:
+            max_rows = self.max_rows
+
+        key = ('search', ' '.join(query.split()), tuple(self.fields), max_rows)
+        return self.adsdata.inflight.do(key, self._query_all, query, max_rows)
+
+    def _query_all(self, query, max_rows):
+        results = []
+        for _, docs in self._iter_pages(query, max_rows):
+            results.extend(docs)
 
         bibcodes = [i['bibcode'] for i in results]
 
         return bibcodes, results
 
+    def _iter_pages(self, query, max_rows=None):
+        '''
+        Yields (numFound, docs) for each page of query, in order.
+
+        The first page tells us numFound, the remaining pages are then
+        downloaded in parallel (at most _max_workers at once).
+        '''
+        if max_rows is None:
+            max_rows = self.max_rows
+
+        data = self._query_page(query, 0)
+        docs = data['response']['docs'][:max_rows]
+        num_found = int(data['response']['numFound'])
+
+        yield num_found, docs
+
+        starts = range(len(docs), min(num_found, max_rows), _rows)
+        if not len(starts):
+            return
+
+        # Worker threads inherit whether this is background work
+        background = self.adsdata.limits.is_background()
+
+        def fetch(start):
+            with self.adsdata.limits.background(background):
+                return self._query_page(query, start)['response']['docs'][:max_rows-start]
+
+        ex = concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers)
+        try:
+            for docs in ex.map(fetch, starts):
+                yield num_found, docs
+        finally:
+            # Dont wait on pages no one wants if the caller stops early
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    def _query_page(self, query, start=0):
+        data = self._query_ads(query,start).json()
+
+        if 'response' not in data:
+            raise SearchError()
+
+        self.adsdata.cache.put_many(data['response']['docs'],self.fields)
+        if 'reference' in self.fields:
+            self.adsdata.graph.add(data['response']['docs'])
+        if len(set(self.fields) & set(offline._indexed)):
+            self.adsdata.offline.add(i['bibcode'] for i in data['response']['docs'])
+
+        return data
+
     def _query_ads(self, query, start=0):
-        r = requests.get(
+        r = self.adsdata.session.get(
                         utils.urls['search'],
-                        auth=utils.BearerAuth(self.adsdata.token),
+                        auth=self.adsdata.auth,
                         params={
                             'q':query,
-                            'fl':_fields,
-                            'rows':100,
+                            'fl':self.fields,
+                            'rows':_rows,
                             'start':start
                             }
                         )
-        # Get rate limits
-        try:
-            _limit = int(r.headers['X-RateLimit-Remaining'])
-            _max_limit = int(r.headers['X-RateLimit-Limit'])
-        except KeyError:
-            pass
-
         return r
 
 
@@ -378,6 +729,18 @@ class search(object):
     def bibcode_multi(self, bibcodes):
         return self.chunked_search(bibcodes,'bibcode:')
 
+    def bibcode_stream(self, pages):
+        '''
+        Like bibcode_multi() but for pages of bibcodes that are still
+        arriving (see libraries.library.stream), returns a stream
+        '''
+        def iter_pages():
+            for num, bibcodes in pages:
+                _, data = planner.planner(self).run([('bibcode', i) for i in bibcodes])
+                yield num, data
+
+        return stream(self.adsdata, iter_pages(), self.fields)
+
     def arxiv_multi(self, arxivids):
         return self.chunked_search(arxivids,'identifier:')
 
@@ -389,6 +752,12 @@ class search(object):
         return self.search('author:"^'+author+'"')
 
     def chunked_search(self, ids, prefix):
+        # Ids we allready know about dont need searching for
+        if prefix in ('bibcode:', 'identifier:'):
+            kind = prefix[:-1]
+            allbibs, alldata = planner.planner(self).run([(kind, i) for i in ids])
+            return journal(self.adsdata,bibcodes=allbibs,data=alldata,fields=self.fields)
+
         # Break up data into chunks to process otherwise we max at 50 entries:
         query = self.chunked_join(ids,prefix=prefix,joiner=' OR ')
         alldata = []
@@ -398,8 +767,72 @@ class search(object):
             alldata.extend(data)
             allbibs.extend(bibs)
 
-        return journal(self.adsdata,bibcodes=allbibs,data=alldata)
+        return journal(self.adsdata,bibcodes=allbibs,data=alldata,fields=self.fields)
+
+    def fetch(self, bibcodes, force=False):
+        '''
+        Returns a dict of bibcode:data, holding our fields, for each of bibcodes.
+
+        Anything fresh in the cache is used as is (unless force), the rest
+        is fetched from ADS 20 bibcodes per query.
+        '''
+        bibcodes = list(bibcodes)
+        found = {}
+        if not force:
+            found = self.adsdata.cache.get_many(bibcodes,self.fields)
+
+        missing = [i for i in bibcodes if i not in found]
+        if not len(missing):
+            return found
+
+        # ADS answers an alias with the canonical bibcode, ask for what
+        # lets us match it back to the one we asked for
+        s = self
+        extra = [i for i in _alias_fields if i not in self.fields]
+        if len(extra):
+            s = search(self.adsdata, max_rows=self.max_rows, fields=list(self.fields)+extra)
+
+        wanted = set(missing)
+        for i in self.chunked_join(missing,prefix='bibcode:',joiner=' OR '):
+            _, data = s._query(i)
+            for j in data:
+                for k in [j['bibcode']] + list(j.get('alternate_bibcode') or []) + list(j.get('identifier') or []):
+                    if k in wanted:
+                        found[k] = j
+
+        return found
+
+
+    def bibtex(self, bibcodes):
+        '''
+        Returns the bibtex entries for bibcodes as one string, in order.
 
+        Entries are cached per bibcode, so only those we have not exported
+        before are sent to ADS, _export_rows bibcodes per request.
+        '''
+        bibcodes = list(bibcodes)
+        found = self.adsdata.cache.get_bibtex(bibcodes)
+        missing = [i for i in bibcodes if i not in found]
+
+        extra = []
+        for pos in range(0, len(missing), _export_rows):
+            chunk = missing[pos:pos + _export_rows]
+            r = self.adsdata.session.post(utils.urls['bibtex'],
+                    auth=self.adsdata.auth,
+                    headers={'Content-Type':'application/json'},
+                    json = {'bibcode':chunk}).json()
+
+            if 'error' in r:
+                raise ValueError(r['error'])
+
+            entries = _split_bibtex(r['export'])
+            self.adsdata.cache.put_bibtex(entries)
+            found.update(entries)
+            # ADS may answer with a different bibcode to the one we asked for
+            extra.extend([v for k,v in entries.items() if k not in chunk])
+
+        result = [found[i] for i in bibcodes if i in found] + extra
+        return '\n\n'.join(result) + '\n'
 
     def chunked_join(self, data,prefix='',joiner='',nmax=20):
         '''
@@ -427,15 +860,77 @@ class search(object):
         return res
 
 
+class stream(object):
+    '''
+    The results of a search, handed out page by page as they arrive.
+
+    num_found is known as soon as the stream is made (after the first page
+    has downloaded), iterating yields article's and journal() waits for
+    everything and returns the usual journal.
+    '''
+    def __init__(self, adsdata, pages, fields=None):
+        self.adsdata = adsdata
+        self._pages = pages
+        self._journal = journal(self.adsdata, [], fields=fields)
+        self.num_found, self._first = next(self._pages, (0, []))
+
+    def __len__(self):
+        return self.num_found
+
+    def pages(self):
+        '''
+        Yields a list of article's for each page
+        '''
+        docs = self._first
+        self._first = []
+        while True:
+            yield self._journal.extend(docs)
+
+            try:
+                _, docs = next(self._pages)
+            except StopIteration:
+                break
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+    def journal(self):
+        '''
+        Waits for the remaining pages and returns everything as a journal
+        '''
+        for _ in self.pages():
+            pass
+        return self._journal
+
+
 class SearchError(Exception):
     pass
 
 
+def _split_bibtex(export):
+    '''
+    Splits the output of the ADS bibtex export into a dict of bibcode:entry,
+    using the adsurl in each entry to find its bibcode
+    '''
+    result = {}
+    for entry in re.split(r'\n(?=@)', export.strip()):
+        match = re.search(r'adsurl\s*=\s*\{.*/abs/([^}/]+)\}', entry)
+        if match:
+            result[urllib.parse.unquote(match.group(1))] = entry.strip()
+    return result
+
+
 
 
 class parseSearch(object):
-    def __init__(self, query):
+    # Urls we can only make sense of by downloading the page
+    _fetched = ['academic.oup.com/mnras', 'aanda.org', 'nature.com', 'sciencemag.org']
+
+    def __init__(self, query, remote=True):
         self._query = query
+        # If False never go to the network, those urls are left as they are
+        self.remote = remote
 
 
     def query(self):
@@ -471,6 +966,9 @@ class parseSearch(object):
         '''
         url  = self._query
 
+        if not self.remote and any(i in url for i in self._fetched):
+            return False
+
         res = {}
         headers = {'user-agent': 'Mozilla /5.0 (Windows NT 10.0; Win64; x64)'}
 
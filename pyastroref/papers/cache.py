@@ -0,0 +1,184 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from . import utils
+from . import planner
+
+# How long (in seconds) a cached field stays fresh, by field name
+_day = 24*60*60
+_ttl = {
+    'citation_count': 1*_day,
+    'reference': 7*_day,
+}
+
+# Fields not listed in _ttl
+_default_ttl = 30*_day
+
+
+class metadata(object):
+    '''
+    On disk (sqlite) store of article metadata keyed by bibcode.
+
+    Each field is stored seperately along with the time it was fetched, so
+    that fast changing fields (citation counts) can go stale before slow
+    changing ones (titles) do. Bibtex entries from the export api are
+    kept alongside, also keyed by bibcode.
+    '''
+    def __init__(self, filename=None, ttl=None):
+        if filename is None:
+            filename = utils.settings['CACHE_FILE']
+        self.filename = filename
+        self.ttl = dict(_ttl)
+        if ttl is not None:
+            self.ttl.update(ttl)
+
+        os.makedirs(os.path.dirname(self.filename),exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS fields (
+                                bibcode TEXT NOT NULL,
+                                field TEXT NOT NULL,
+                                value TEXT,
+                                fetched REAL NOT NULL,
+                                PRIMARY KEY (bibcode, field)
+                                )''')
+            # Every id (arXiv id, doi, alternate bibcode) we know an article by
+            self._db.execute('''CREATE TABLE IF NOT EXISTS identifiers (
+                                identifier TEXT PRIMARY KEY,
+                                bibcode TEXT NOT NULL
+                                )''')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS bibtex (
+                                bibcode TEXT PRIMARY KEY,
+                                entry TEXT NOT NULL,
+                                fetched REAL NOT NULL
+                                )''')
+
+    def _fresh(self, field, fetched, now):
+        return now - fetched < self.ttl.get(field, _default_ttl)
+
+    def get(self, bibcode, fields):
+        '''
+        Returns the cached data for bibcode or None if any of fields
+        is missing or stale
+        '''
+        return self.get_many([bibcode], fields).get(bibcode)
+
+    def get_many(self, bibcodes, fields, stale=False):
+        '''
+        Returns a dict of bibcode:data for each bibcode in bibcodes
+        that has every field in fields cached and fresh (or at all if stale)
+        '''
+        bibcodes = list(bibcodes)
+        fields = set(fields)
+        now = time.time()
+
+        rows = []
+        with self._lock:
+            # Stay well under sqlite's limit on host parameters
+            for pos in range(0, len(bibcodes), 500):
+                chunk = bibcodes[pos:pos+500]
+                rows.extend(self._db.execute(
+                    'SELECT bibcode, field, value, fetched FROM fields WHERE bibcode IN ({})'.format(
+                        ','.join('?'*len(chunk))),
+                    chunk).fetchall())
+
+        found = {}
+        for bibcode, field, value, fetched in rows:
+            if field in fields and (stale or self._fresh(field, fetched, now)):
+                found.setdefault(bibcode, {})[field] = json.loads(value)
+
+        result = {}
+        for bibcode, data in found.items():
+            if len(data) == len(fields):
+                # Fields ADS did not return are stored as null
+                result[bibcode] = {k:v for k,v in data.items() if v is not None}
+                result[bibcode]['bibcode'] = bibcode
+
+        return result
+
+    def put(self, data, fields):
+        self.put_many([data], fields)
+
+    def put_many(self, docs, fields):
+        '''
+        Stores each doc in docs (as returned by an ADS search on fields).
+
+        Fields that were asked for but not returned are stored as null
+        so we know ADS does not have them.
+        '''
+        now = time.time()
+        rows = []
+        ids = []
+        for doc in docs:
+            for f in fields:
+                rows.append((doc['bibcode'], f, json.dumps(doc.get(f)), now))
+            for f in ('identifier', 'alternate_bibcode'):
+                if f in fields:
+                    ids.extend((planner.normalize(i), doc['bibcode']) for i in doc.get(f, []))
+
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO fields VALUES (?,?,?,?)', rows)
+            self._db.executemany('INSERT OR REPLACE INTO identifiers VALUES (?,?)', ids)
+
+    def resolve(self, identifiers):
+        '''
+        Returns a dict of normalized identifier:bibcode for each of
+        identifiers (see planner.normalize) we know the bibcode of
+        '''
+        keys = list({planner.normalize(i) for i in identifiers})
+        result = {}
+        with self._lock:
+            for pos in range(0, len(keys), 500):
+                chunk = keys[pos:pos+500]
+                result.update(self._db.execute(
+                    'SELECT identifier, bibcode FROM identifiers WHERE identifier IN ({})'.format(
+                        ','.join('?'*len(chunk))),
+                    chunk))
+        return result
+
+    def get_bibtex(self, bibcodes):
+        '''
+        Returns a dict of bibcode:bibtex entry for each fresh entry we have
+        '''
+        bibcodes = list(bibcodes)
+        now = time.time()
+
+        rows = []
+        with self._lock:
+            for pos in range(0, len(bibcodes), 500):
+                chunk = bibcodes[pos:pos+500]
+                rows.extend(self._db.execute(
+                    'SELECT bibcode, entry, fetched FROM bibtex WHERE bibcode IN ({})'.format(
+                        ','.join('?'*len(chunk))),
+                    chunk).fetchall())
+
+        return {bibcode:entry for bibcode, entry, fetched in rows
+                    if self._fresh('bibtex', fetched, now)}
+
+    def put_bibtex(self, entries):
+        '''
+        Stores a dict of bibcode:bibtex entry
+        '''
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO bibtex VALUES (?,?,?)',
+                                [(k, v, now) for k, v in entries.items()])
+
+    def remove(self, bibcode):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM fields WHERE bibcode = ?', (bibcode,))
+            self._db.execute('DELETE FROM identifiers WHERE bibcode = ?', (bibcode,))
+            self._db.execute('DELETE FROM bibtex WHERE bibcode = ?', (bibcode,))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM fields')
+            self._db.execute('DELETE FROM identifiers')
+            self._db.execute('DELETE FROM bibtex')
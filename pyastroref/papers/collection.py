@@ -2,7 +2,7 @@
 
 import os
 import re
-import requests
+import bisect
 import datetime
 from pathlib import Path
 
@@ -10,6 +10,48 @@ from . import utils
 from . import articles
 
 
+class index(object):
+    '''
+    Lookup of journals (a dict of name:bibstem) by what the user types.
+
+    prefix() matches the start of the name, of any word in the name or of
+    the bibstem, using a sorted array of keys so it is a pair of binary
+    searches. substring() matches anywhere in the name or bibstem. Both
+    ignore case and return names in alphabetical order.
+    '''
+    def __init__(self, journals):
+        keys = set()
+        for name, bibstem in journals.items():
+            words = name.lower().split()
+            for i in range(len(words)):
+                keys.add((' '.join(words[i:]), name))
+            keys.add((bibstem.lower(), name))
+
+        keys = sorted(keys)
+        self._keys = [i[0] for i in keys]
+        self._names = [i[1] for i in keys]
+
+        self.names = sorted(journals, key=str.lower)
+        self._text = [(name, name.lower()+'\n'+journals[name].lower()) for name in self.names]
+
+    def prefix(self, query):
+        query = ' '.join(query.lower().split())
+        start = bisect.bisect_left(self._keys, query)
+        end = bisect.bisect_left(self._keys, query+'\uffff', lo=start)
+        return sorted(set(self._names[start:end]), key=str.lower)
+
+    def substring(self, query):
+        query = query.lower().strip()
+        return [name for name, text in self._text if query in text]
+
+    def find(self, query, substring=False):
+        if not len(query.strip()):
+            return list(self.names)
+        if substring:
+            return self.substring(query)
+        return self.prefix(query)
+
+
 class Collection(object):
     _url = 'http://adsabs.harvard.edu/abs_doc/journals1.html'
 
@@ -66,13 +108,15 @@ class Collection(object):
             self.make_file()
 
         self.all_journals = self.read_file(self._file_all)
+        # Covers both lists so it stays valid as journals move between them
+        self.index = index({**self.all_journals, **self.default_journals})
         # Remove default journals
         for k in self.default_journals.keys():
             self.all_journals.pop(k, None)
 
 
     def make_file(self):
-        r = requests.get(self._url)
+        r = self.adsdata.session.get(self._url)
         data = r.content.decode().split('\n')
         
         res = {}
@@ -92,6 +136,8 @@ class Collection(object):
         with open(filename,'r') as f:
             for line in f.readlines():
                 l = line.split()
+                if not len(l):
+                    continue
                 value = l[-1]
                 key = ' '.join(l[:-1])
                 all_journals[key.strip()] = value.strip()
@@ -109,6 +155,12 @@ class Collection(object):
     def list_all(self):
         return self.all_journals.keys()
 
+    def find(self, query, substring=False):
+        '''
+        Names of journals matching query (see index), alphabetical
+        '''
+        return self.index.find(query, substring)
+
     def search(self, name):
         for value in self.default_journals:
             if value == name:
@@ -0,0 +1,272 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import time
+import threading
+import concurrent.futures
+import urllib.parse
+
+import requests
+
+from . import utils
+
+# Bytes read from the network at a time
+_chunk_size = 64*1024
+
+# How many times to pick a dropped download back up
+_retries = 3
+
+# Pretend to be Firefox otherwise we hit captchas
+_headers = {'user-agent': 'Mozilla /5.0 (Windows NT 10.0; Win64; x64)'}
+
+_magic = b'%PDF'
+_eof = b'%%EOF'
+
+# Readers allow junk after %%EOF, look this many bytes back for it
+_tail = 1024
+
+# Redirects to follow by hand when being polite to each host
+_max_redirects = 10
+
+# Downloads at once from any one server
+_per_host = 2
+
+# Minimum time (seconds) between starting requests to the same server
+_host_delay = 1.0
+
+
+class Cancelled(Exception):
+    pass
+
+
+class hosts(object):
+    '''
+    Politeness limits shared between downloads: at most per_host requests
+    open to any one server at a time, started at least delay seconds apart.
+    '''
+    def __init__(self, per_host=_per_host, delay=_host_delay):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._last = {}
+
+    def _host(self, url):
+        return urllib.parse.urlsplit(url).netloc.lower()
+
+    def acquire(self, url):
+        host = self._host(url)
+        with self._lock:
+            slot = self._slots.setdefault(host, threading.Semaphore(self.per_host))
+        slot.acquire()
+
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._last.get(host, 0) + self.delay)
+            self._last[host] = start
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, url):
+        self._slots[self._host(url)].release()
+
+
+class downloader(object):
+    '''
+    Streams files to disk.
+
+    Each download goes to filename.part in chunks and is only renamed to
+    filename once it is complete and looks like a PDF, so a dropped
+    connection never leaves a half written file behind. A .part file left
+    by an earlier attempt is resumed with a Range request. tag is added
+    to the .part file names so two downloaders can fetch the same file
+    at once.
+    '''
+    def __init__(self, session, chunk_size=_chunk_size, retries=_retries, hosts=None, tag=''):
+        self.session = session
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.hosts = hosts
+        self.tag = tag
+
+    def fetch(self, url, filename, cancel=None):
+        '''
+        Downloads url to filename, returns True if we got a PDF.
+
+        cancel is an optional threading.Event that stops the download
+        (raising Cancelled) between chunks.
+        '''
+        part = filename + self.tag + '.part'
+        if self.download(url, part, cancel):
+            os.replace(part, filename)
+            return True
+        return False
+
+    def download(self, url, part, cancel=None):
+        '''
+        Downloads url into the file part, resuming it if it exists and
+        retrying dropped connections. Returns True if it holds a PDF,
+        otherwise part is removed (unless the network gave up on us, then
+        it is kept to resume from next time). Any other requests error
+        (ie a redirect loop) just means this url failed.
+        '''
+        for _ in range(self.retries + 1):
+            try:
+                result = self._fetch(url, part, cancel)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                # Keep the .part file and pick up where we left off
+                continue
+            except utils.RateLimitError:
+                # Out of quota for now, keep the .part file for later
+                return False
+            except requests.RequestException:
+                # Redirect loops (ie to a login page), bad urls etc, this source wont work
+                _remove(part)
+                return False
+
+            if not result:
+                _remove(part)
+            return result
+
+        return False
+
+    def _fetch(self, url, part, cancel):
+        headers = dict(_headers)
+        start = os.path.getsize(part) if os.path.exists(part) else 0
+        if start:
+            headers['Range'] = 'bytes={}-'.format(start)
+
+        url, r = self._open(url, headers)
+        try:
+            return self._save(r, part, start, cancel)
+        finally:
+            if self.hosts is not None:
+                self.hosts.release(url)
+
+    def _open(self, url, headers):
+        # Follows redirects ourselves so each server gets its own politeness limit
+        if self.hosts is None:
+            return url, self.session.get(url, headers=headers, allow_redirects=True, stream=True)
+
+        for _ in range(_max_redirects):
+            self.hosts.acquire(url)
+            try:
+                r = self.session.get(url, headers=headers, allow_redirects=False, stream=True)
+            except BaseException:
+                self.hosts.release(url)
+                raise
+            location = r.headers.get('Location')
+            if not r.is_redirect or location is None:
+                return url, r
+            r.close()
+            self.hosts.release(url)
+            url = urllib.parse.urljoin(url, location)
+
+        raise requests.TooManyRedirects('Exceeded {} redirects'.format(_max_redirects))
+
+    def _save(self, r, part, start, cancel):
+        with r:
+            if r.status_code == 416:
+                # We allready have all of it
+                return is_pdf(part)
+            if r.status_code >= 400:
+                return False
+
+            if r.status_code == 206 and _range_start(r) == start:
+                mode = 'ab'
+            else:
+                # Server ignored the Range header, start again
+                mode = 'wb'
+                start = 0
+
+            if 'html' in r.headers.get('Content-Type', '') and not start:
+                # A login or captcha page instead of the paper
+                return False
+
+            with open(part, mode) as f:
+                for chunk in r.iter_content(self.chunk_size):
+                    if cancel is not None and cancel.is_set():
+                        raise Cancelled()
+                    if not start and f.tell() == 0 and not chunk.startswith(_magic):
+                        return False
+                    f.write(chunk)
+
+            # Content-Length is of the encoded body if it was compressed
+            expected = r.headers.get('Content-Length')
+            if (expected is not None and 'Content-Encoding' not in r.headers
+                    and os.path.getsize(part) != start + int(expected)):
+                raise requests.exceptions.ChunkedEncodingError('Short read')
+
+        return is_pdf(part)
+
+    def race(self, urls, filename):
+        '''
+        Downloads every url in urls (a dict of name:url) at once, keeping
+        the first PDF to finish and cancelling the rest.
+
+        Returns the name of the url used or None
+        '''
+        cancel = threading.Event()
+        lock = threading.Lock()
+        winner = []
+
+        def fetch(name):
+            part = '{}.{}{}.part'.format(filename, name.strip('/'), self.tag)
+            try:
+                ok = self.download(urls[name], part, cancel=cancel)
+            except Cancelled:
+                ok = False
+
+            with lock:
+                if ok and not len(winner):
+                    os.replace(part, filename)
+                    winner.append(name)
+                    cancel.set()
+                    return
+            # Lost the race (or failed), no point resuming this one later
+            _remove(part)
+
+        ex = concurrent.futures.ThreadPoolExecutor(max_workers=len(urls) or 1)
+        try:
+            futures = [ex.submit(fetch, i) for i in urls]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+                if len(winner):
+                    # The rest clean up after themselves
+                    break
+        finally:
+            ex.shutdown(wait=False)
+
+        return winner[0] if len(winner) else None
+
+
+def _range_start(r):
+    # Content-Range: bytes 1000-1999/2000
+    try:
+        return int(r.headers['Content-Range'].split()[1].split('-')[0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def is_pdf(filename):
+    '''
+    True if filename starts like a PDF and ends with an %%EOF marker
+    (so error pages and downloads cut short fail)
+    '''
+    try:
+        with open(filename, 'rb') as f:
+            if f.read(len(_magic)) != _magic:
+                return False
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - _tail, 0))
+            return _eof in f.read()
+    except OSError:
+        return False
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,125 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import time
+import sqlite3
+import threading
+
+from . import utils
+
+
+def _chunks(data, nmax=500):
+    # Stay well under sqlite's limit on host parameters
+    for pos in range(0, len(data), nmax):
+        yield data[pos:pos+nmax]
+
+
+class graph(object):
+    '''
+    Local (sqlite) index of the citation graph.
+
+    Built from the reference lists of every search result that passes
+    through the papers layer. An article's references are known exactly
+    once we have seen its reference field, citations are only known
+    amongst the articles we have reference lists for.
+    '''
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = utils.settings['CACHE_FILE']
+        self.filename = filename
+
+        os.makedirs(os.path.dirname(self.filename),exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            # source cites target
+            self._db.execute('''CREATE TABLE IF NOT EXISTS refs (
+                                source TEXT NOT NULL,
+                                target TEXT NOT NULL,
+                                PRIMARY KEY (source, target)
+                                )''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS refs_target ON refs (target)')
+            # Articles whose full reference list is in refs
+            self._db.execute('''CREATE TABLE IF NOT EXISTS known (
+                                source TEXT PRIMARY KEY,
+                                fetched REAL NOT NULL
+                                )''')
+
+    def add(self, docs):
+        '''
+        Adds the edges from docs, each of which must have been fetched
+        with the reference field (ADS leaves it out if there are none)
+        '''
+        now = time.time()
+        edges = []
+        known = []
+        for doc in docs:
+            known.append((doc['bibcode'], now))
+            for target in doc.get('reference', []):
+                edges.append((doc['bibcode'], target))
+
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM refs WHERE source = ?', [(i,) for i, _ in known])
+            self._db.executemany('INSERT OR IGNORE INTO refs VALUES (?,?)', edges)
+            self._db.executemany('INSERT OR REPLACE INTO known VALUES (?,?)', known)
+
+    def known(self, bibcodes):
+        '''
+        Returns the subset of bibcodes whose reference lists we have
+        '''
+        bibcodes = list(bibcodes)
+        result = set()
+        with self._lock:
+            for chunk in _chunks(bibcodes):
+                result.update(i for i, in self._db.execute(
+                    'SELECT source FROM known WHERE source IN ({})'.format(','.join('?'*len(chunk))),
+                    chunk))
+        return result
+
+    def references(self, bibcode):
+        '''
+        Returns the bibcodes bibcode cites or None if we dont know
+        '''
+        if not len(self.known([bibcode])):
+            return None
+        with self._lock:
+            return [i for i, in self._db.execute('SELECT target FROM refs WHERE source = ?', (bibcode,))]
+
+    def citations(self, bibcode):
+        '''
+        Returns the bibcodes, out of those we know about, that cite bibcode
+        '''
+        with self._lock:
+            return [i for i, in self._db.execute('SELECT source FROM refs WHERE target = ?', (bibcode,))]
+
+    def coupled(self, bibcodes):
+        '''
+        Papers citing papers that bibcodes cite (two hops: out then back in).
+
+        Returns a list of (bibcode, number of shared references), most shared
+        first, ignoring bibcodes themselves. Only uses local data, see
+        known() to find which of bibcodes we have reference lists for.
+        '''
+        bibcodes = list(bibcodes)
+        targets = set()
+        counts = {}
+        with self._lock:
+            for chunk in _chunks(bibcodes):
+                targets.update(i for i, in self._db.execute(
+                    'SELECT target FROM refs WHERE source IN ({})'.format(','.join('?'*len(chunk))),
+                    chunk))
+
+            # Chunks of targets dont overlap so the counts can be summed
+            for chunk in _chunks(list(targets)):
+                rows = self._db.execute(
+                    'SELECT source, COUNT(*) FROM refs WHERE target IN ({}) GROUP BY source'.format(
+                        ','.join('?'*len(chunk))),
+                    chunk)
+                for source, count in rows:
+                    counts[source] = counts.get(source, 0) + count
+
+        for i in bibcodes:
+            counts.pop(i, None)
+
+        return sorted(counts.items(), key=lambda x: x[1], reverse=True)
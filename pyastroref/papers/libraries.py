@@ -2,12 +2,24 @@
 
 import os
 import re
-import requests
 import datetime
+import concurrent.futures
 from pathlib import Path
 
+import requests
+
 from . import utils
 from . import articles
+from . import snapshots
+
+# Documents per page when downloading a library
+_rows = 500
+
+# Maximum number of pages to download at once
+_max_workers = 4
+
+# Times to download a library that keeps changing under us
+_retries = 2
 
 class libraries(object):
     '''
@@ -16,11 +28,13 @@ class libraries(object):
     def __init__(self, adsdata):
         self.adsdata = adsdata
         self._data = None
+        # One library object per library id, see _library()
+        self._libs = {}
         
     def update(self):
-        data = requests.get(
+        data = self.adsdata.session.get(
                             utils.urls['libraries'],
-                            auth=utils.BearerAuth(self.adsdata.token)
+                            auth=self.adsdata.auth
                             ).json()
 
         self._data = {}
@@ -34,6 +48,44 @@ class libraries(object):
         for value in data:
             self._data[value['name']] = value
 
+        # Libraries we allready have get their metadata refreshed, and
+        # their documents synced again next time if ADS says they changed
+        ids = {value['id'] for value in data}
+        for lid in list(self._libs):
+            if lid not in ids:
+                self.invalidate(lid)
+        for value in data:
+            lib = self._libs.get(value['id'])
+            if lib is None:
+                continue
+            if lib._metadata is not None and snapshots.changed(lib._metadata, value):
+                lib.invalidate()
+            lib.metadata = value
+
+    def _library(self, name):
+        # The same library object every time, so its documents are only loaded once
+        value = self._data[name]
+        lid = value['id']
+        if lid not in self._libs:
+            self._libs[lid] = library(self.adsdata, lid, metadata=value)
+        return self._libs[lid]
+
+    def invalidate(self, libraryid):
+        '''
+        Forgets the library object for libraryid, the next look up makes a new one
+        '''
+        self._libs.pop(libraryid, None)
+
+    def resync(self, libraryid):
+        '''
+        Throws away our copy of libraryid's documents (ie local changes ADS
+        rejected), the next access downloads them again
+        '''
+        self.adsdata.snapshots.remove(libraryid)
+        lib = self._libs.get(libraryid)
+        if lib is not None:
+            lib.invalidate()
+
     def names(self):
         if self._data is None:
             self.update()
@@ -45,19 +97,23 @@ class libraries(object):
         if self._data is None:
             self.update()
         if key in self._data.keys():
-            return library(self.adsdata,self._data[key]['id'])
+            return self._library(key)
 
     def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
         if self._data is None:
             self.update()
         if key in self._data.keys():
-            return library(self.adsdata,self._data[key]['id'])
+            return self._library(key)
 
     def get(self, name):
         '''
         Fetches library
         '''
-        return library(self.adsdata,self._data[name]['id'])
+        if self._data is None:
+            self.update()
+        return self._library(name)
 
     def add(self, name, description='', public=False):
         '''
@@ -68,9 +124,9 @@ class libraries(object):
             'public':public,
             'description':description
             }
-        r = requests.post(
+        r = self.adsdata.session.post(
                             utils.urls['libraries'],
-                            auth=utils.BearerAuth(self.adsdata.token),
+                            auth=self.adsdata.auth,
                             headers={'Content-Type':'application/json'},
                             json = data
                         ).json()
@@ -88,11 +144,13 @@ class libraries(object):
 
         lid = self._data[name]['id']
 
-        requests.delete(
+        self.adsdata.session.delete(
                             utils.urls['documents']+'/'+lid,
-                            auth=utils.BearerAuth(self.adsdata.token)
+                            auth=self.adsdata.auth
                         )
         self._data.pop(name,None)
+        self.invalidate(lid)
+        self.adsdata.snapshots.remove(lid)
 
 
     def edit(self,name, name_new=None,description=None,public=False):
@@ -114,12 +172,14 @@ class libraries(object):
             'description':description
             }
 
-        requests.put(
+        self.adsdata.session.put(
                         utils.urls['documents']+'/'+lid,
-                        auth=utils.BearerAuth(self.adsdata.token),
+                        auth=self.adsdata.auth,
                         headers={'Content-Type':'application/json'},
                         json = data
                     )
+        # Name and description may have changed
+        self.update()
 
 
     def keys(self):
@@ -128,19 +188,17 @@ class libraries(object):
         return self._data.keys()
 
     def __len__(self):
-        if self._data is not None:
-            return len(self._data)
-        else:
-            return 0
+        if self._data is None:
+            self.update()
+        return len(self._data)
 
     def __contains__(self, key):
-        if self._data is not None:
-            return key in self._data
-        else:
-            return False
+        if self._data is None:
+            self.update()
+        return key in self._data
 
     def __iter__(self):
-        for i in self._data:
+        for i in list(self.keys()):
             yield self.get(i)
 
     def __dir__(self):
@@ -156,11 +214,37 @@ class library(object):
     '''
     An instance of a single ADS library
     '''
-    def __init__(self, adsdata, libraryid):
+    def __init__(self, adsdata, libraryid, metadata=None):
         self.adsdata = adsdata
         self.libraryid = libraryid
-        self._data = []
-        self.update()
+        # Documents are only loaded when first needed
+        self._data = None
+        self._metadata = metadata
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = self._check()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata):
+        self._metadata = metadata
+
+    @property
+    def name(self):
+        return self.metadata['name']
+
+    def _documents(self):
+        if self._data is None:
+            self.update()
+        return self._data
+
+    def invalidate(self):
+        '''
+        Forgets the documents, the next access syncs with ADS again
+        '''
+        self._data = None
 
     def url(self):
         return utils.urls['libraries'] + '/' + self.libraryid 
@@ -168,39 +252,149 @@ class library(object):
     def url_docs(self):
         return utils.urls['documents'] + '/' + self.libraryid 
 
-    def update(self):
-        self._data = []
+    def update(self, force=False):
+        '''
+        Syncs with ADS, only downloading the documents if ADS says the
+        library changed since our local copy (or if force)
+        '''
+        if not force and self._from_snapshot():
+            return
+
+        # Anyone else updating this library right now shares our download
+        documents, metadata = self.adsdata.inflight.do(('library', self.libraryid),
+                                                        self._download)
+        self._store(documents, metadata)
 
-        data = requests.get(
+    def _from_snapshot(self):
+        # Loads our local copy if ADS says it is still current
+        snapshot = self.adsdata.snapshots.get(self.libraryid)
+        if snapshot is None:
+            return False
+
+        metadata = self._check()
+        if snapshots.changed(snapshot[0], metadata):
+            return False
+
+        self._data = list(snapshot[1])
+        self.metadata = metadata
+        return True
+
+    def _store(self, documents, metadata):
+        if len(documents) != int(metadata['num_documents']):
+            # Changed while we were downloading, make sure the next sync tries again
+            metadata = dict(metadata, num_documents=len(documents))
+
+        # Plus anything we have not told ADS about yet
+        documents = self.adsdata.writes.overlay(self.libraryid, documents)
+        self.adsdata.snapshots.put(self.libraryid, metadata, documents)
+        self._data = list(documents)
+        self.metadata = metadata
+
+    def stream(self, force=False):
+        '''
+        Yields (num_documents, bibcodes) for each page of the library as
+        it arrives, so work can start on the first page before the last
+        one has downloaded. A library that has not changed comes out as
+        one page.
+        '''
+        if not force and (self._data is not None or self._from_snapshot()):
+            yield len(self._data), list(self._data)
+            return
+
+        pending = self.adsdata.writes.pending(self.libraryid)
+        removed = {b for _, action, b in pending if action == 'remove'}
+
+        documents = []
+        seen = set()
+        for metadata, docs in self._iter_pages():
+            docs = [i for i in docs if i not in seen]
+            seen.update(docs)
+            documents.extend(docs)
+            yield int(metadata['num_documents']), [i for i in docs if i not in removed]
+
+        added = [b for _, action, b in pending if action == 'add' and b not in seen]
+        if len(added):
+            yield int(metadata['num_documents']), added
+
+        self._store(documents, metadata)
+
+    def _check(self):
+        # Just the metadata (and one document, we cant ask for none)
+        data = self.adsdata.session.get(
                             self.url(),
-                            auth=utils.BearerAuth(self.adsdata.token)
+                            auth=self.adsdata.auth,
+                            params={'rows':1}
                         ).json()
-        self._data.extend(data['documents'])
-
-        total_num = int(data['metadata']['num_documents'])
-        if len(self._data) < total_num:
-            num_left = total_num - len(self._data)
-            data = requests.get(
-                                self.url()+'?start='+str(len(self._data))+'&rows='+str(num_left),
-                                auth=utils.BearerAuth(self.adsdata.token)
-                            ).json()
-            self._data.extend(data['documents'])
+        return data['metadata']
+
+    def _download(self):
+        documents = []
+        for attempt in range(_retries):
+            documents = []
+            for metadata, docs in self._iter_pages():
+                documents.extend(docs)
+            # A page boundary can shift if the library changes under us
+            documents = list(dict.fromkeys(documents))
+            if len(documents) == int(metadata['num_documents']):
+                break
+
+        return documents, metadata
+
+    def _page(self, start):
+        return self.adsdata.session.get(
+                            self.url(),
+                            auth=self.adsdata.auth,
+                            params={'start':start, 'rows':_rows}
+                        ).json()
+
+    def _iter_pages(self):
+        '''
+        Yields (metadata, bibcodes) for each page of the library, in order.
+
+        The first page tells us num_documents, the remaining pages are then
+        downloaded in parallel (at most _max_workers at once).
+        '''
+        data = self._page(0)
+        metadata = data['metadata']
+        yield metadata, data['documents']
+
+        # ADS may send fewer rows than we asked for
+        step = len(data['documents'])
+        if not step:
+            return
+        starts = range(step, int(metadata['num_documents']), step)
+        if not len(starts):
+            return
 
-        self.metadata = data['metadata']
-        self.name = self.metadata['name']
+        # Worker threads inherit whether this is background work
+        background = self.adsdata.limits.is_background()
+
+        def fetch(start):
+            with self.adsdata.limits.background(background):
+                return self._page(start)['documents']
+
+        ex = concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers)
+        try:
+            for docs in ex.map(fetch, starts):
+                yield metadata, docs
+        finally:
+            # Dont wait on pages no one wants if the caller stops early
+            ex.shutdown(wait=False, cancel_futures=True)
 
     def keys(self):
-        return self._data
+        return self._documents()
 
     @property
     def description(self):
         return self.metadata['description']
 
     def __getitem__(self,key):
-        if key in self._data:
+        if key in self._documents():
             return articles.article(self.adsdata,key)
 
     def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
         if key in self.metadata.keys():
             return self.metadata[key]
 
@@ -210,44 +404,71 @@ class library(object):
     def get(self, bibcode):
         return articles.article(self.adsdata,bibcode=bibcode)
 
+    def bibtex(self):
+        '''
+        Returns the bibtex for every article in the library
+        '''
+        return articles.search(self.adsdata).bibtex(self._documents())
+
     def add(self, bibcode):
         '''
         Add bibcode to library
+
+        Shows up locally straight away, ADS is told in the background (see writes.queue)
         '''
-        data = {'bibcode':self._ensure_list(bibcode),"action":"add"}
-        r = requests.post(
-                            self.url_docs(),
-                            auth=utils.BearerAuth(self.adsdata.token),
-                            headers={'Content-Type':'application/json'},
-                            json = data
-                        ).json()
-        # Error check:
-        if 'number_added' not in r:
-            raise ValueError(r['message'])
+        bibcodes = self._ensure_list(bibcode)
+        self.adsdata.writes.add(self.libraryid, bibcodes)
+        if self._data is not None:
+            self._data = snapshots.apply(self._data, 'add', bibcodes)
 
     def remove(self, bibcode):
         '''
         Remove bibcode from library
+
+        Shows up locally straight away, ADS is told in the background (see writes.queue)
+        '''
+        bibcodes = self._ensure_list(bibcode)
+        self.adsdata.writes.remove(self.libraryid, bibcodes)
+        if self._data is not None:
+            self._data = snapshots.apply(self._data, 'remove', bibcodes)
+
+    def post(self, action, bibcodes):
         '''
-        data = {'bibcode':self._ensure_list(bibcode),"action":"remove"}
-        r = requests.post(
+        Sends one add or remove (action) of bibcodes to ADS now
+
+        Raises ValueError if ADS rejects the change, utils.RateLimitError
+        or requests.HTTPError if it should be tried again later
+        '''
+        data = {'bibcode':list(bibcodes),"action":action}
+        response = self.adsdata.session.post(
                             self.url_docs(),
-                            auth=utils.BearerAuth(self.adsdata.token),
+                            auth=self.adsdata.auth,
                             headers={'Content-Type':'application/json'},
                             json = data
-                        ).json()
+                        )
+        if response.status_code == 429:
+            raise utils.RateLimitError('ADS rate limited library change')
+        if response.status_code >= 500:
+            response.raise_for_status()
+        try:
+            r = response.json()
+        except ValueError:
+            # An error page rather than ADS's answer
+            raise requests.HTTPError('Bad response from ADS ({})'.format(response.status_code),
+                                    response=response)
         # Error check:
-        if 'number_removed' not in r:
-            raise ValueError(r['message'])
+        if 'number_added' not in r and 'number_removed' not in r:
+            raise ValueError(r.get('message', r.get('error')))
+        return r
 
     def __len__(self):
-        return len(self._data)
+        return len(self._documents())
 
     def __contains__(self, key):
-        return key in self._data
+        return key in self._documents()
 
     def __iter__(self):
-        for i in self._data:
+        for i in self._documents():
             yield self.get(i)
 
     # Just makes sure we have a list of strings
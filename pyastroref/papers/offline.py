@@ -0,0 +1,198 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import re
+import json
+import sqlite3
+import threading
+
+from . import utils
+
+# ADS search terms we can answer, and the index column each searches
+_terms = {
+    'author': 'author',
+    'title': 'title',
+    'abs': 'abstract',
+    'abstract': 'abstract',
+    'bibstem': 'bibstem',
+    'year': 'year',
+}
+
+# Fields copied out of the metadata cache into the index
+_indexed = ['title', 'abstract', 'author', 'bibstem', 'year']
+
+# A term is either field:"phrase", field:[a TO b], field:word or a bare word/phrase
+_token = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|\[([^\]]*)\]|(\S+))')
+
+
+def _chunks(data, nmax=500):
+    for pos in range(0, len(data), nmax):
+        yield data[pos:pos+nmax]
+
+
+class engine(object):
+    '''
+    Offline full text search over every article in the metadata cache.
+
+    Uses an sqlite FTS5 index, in the same file as the cache, over titles,
+    abstracts, authors, bibstems and years. Understands a subset of the
+    ADS syntax: author:"Smith, J" (author:"^Smith" for first author),
+    title:, abs:, bibstem:, year:2010 or year:[2000 TO 2010] and bare words,
+    all ANDed together.
+    '''
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = utils.settings['CACHE_FILE']
+        self.filename = filename
+
+        os.makedirs(os.path.dirname(self.filename),exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS offline_docs (
+                                id INTEGER PRIMARY KEY,
+                                bibcode TEXT UNIQUE NOT NULL,
+                                year INTEGER
+                                )''')
+            self._db.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS offline_fts USING fts5(
+                                title, abstract, author, first_author, bibstem, year
+                                )''')
+
+        if self._empty():
+            self.rebuild()
+
+    def _empty(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM offline_docs').fetchone()[0] == 0
+
+    def rebuild(self):
+        '''
+        Indexes everything in the metadata cache
+        '''
+        with self._lock:
+            try:
+                bibcodes = [i for i, in self._db.execute('SELECT DISTINCT bibcode FROM fields')]
+            except sqlite3.OperationalError:
+                # No cache yet
+                return
+        self.add(bibcodes)
+
+    def add(self, bibcodes):
+        '''
+        (Re)indexes bibcodes from what the metadata cache holds for them
+        '''
+        bibcodes = list(bibcodes)
+        docs = {}
+        with self._lock:
+            for chunk in _chunks(bibcodes):
+                rows = self._db.execute(
+                    'SELECT bibcode, field, value FROM fields WHERE bibcode IN ({}) AND field IN ({})'.format(
+                        ','.join('?'*len(chunk)), ','.join('?'*len(_indexed))),
+                    chunk + _indexed)
+                for bibcode, field, value in rows:
+                    docs.setdefault(bibcode, {})[field] = json.loads(value)
+
+            with self._db:
+                for bibcode, doc in docs.items():
+                    authors = doc.get('author') or []
+                    year = doc.get('year')
+                    self._db.execute('INSERT OR IGNORE INTO offline_docs (bibcode) VALUES (?)', (bibcode,))
+                    rowid = self._db.execute('SELECT id FROM offline_docs WHERE bibcode = ?',
+                                                (bibcode,)).fetchone()[0]
+                    self._db.execute('UPDATE offline_docs SET year = ? WHERE id = ?',
+                                    (int(year) if year else None, rowid))
+                    self._db.execute('DELETE FROM offline_fts WHERE rowid = ?', (rowid,))
+                    self._db.execute('INSERT INTO offline_fts (rowid, title, abstract, author, first_author, bibstem, year) VALUES (?,?,?,?,?,?,?)',
+                                    (rowid,
+                                    ' '.join(doc.get('title') or []),
+                                    doc.get('abstract') or '',
+                                    '; '.join(authors),
+                                    authors[0] if len(authors) else '',
+                                    ' '.join(doc.get('bibstem') or []),
+                                    year or ''))
+
+    def parse(self, query):
+        '''
+        Turns an ADS style query into (fts match expression, year range).
+
+        Returns None if the query uses something we can not answer.
+        '''
+        match = []
+        year = [None, None]
+        for field, phrase, span, word in _token.findall(query):
+            if not field and word in ('AND',):
+                continue
+            if not field and word in ('OR', 'NOT'):
+                return None
+
+            value = phrase or span or word
+            if field and field not in _terms:
+                return None
+            if word and '(' in word:
+                # Operators like citations() or references()
+                return None
+            column = _terms.get(field)
+
+            if column == 'year':
+                if span:
+                    low, _, high = span.partition(' TO ')
+                else:
+                    low = high = value
+                try:
+                    if low.strip() not in ('', '*'):
+                        year[0] = int(low)
+                    if high.strip() not in ('', '*'):
+                        year[1] = int(high)
+                except ValueError:
+                    return None
+                continue
+
+            if column == 'author' and value.startswith('^'):
+                column = 'first_author'
+                value = value[1:]
+
+            value = value.replace('"', '""')
+            if column is None:
+                match.append('"{}"'.format(value))
+            else:
+                match.append('{} : "{}"'.format(column, value))
+
+        return ' AND '.join(match), year
+
+    def search(self, query, max_rows=None):
+        '''
+        Returns the bibcodes matching query, newest first,
+        or None if the query is not one we understand
+        '''
+        parsed = self.parse(query)
+        if parsed is None:
+            return None
+        match, (low, high) = parsed
+
+        sql = 'SELECT d.bibcode FROM offline_docs d'
+        where = []
+        args = []
+        if len(match):
+            sql += ' JOIN offline_fts f ON f.rowid = d.id'
+            where.append('offline_fts MATCH ?')
+            args.append(match)
+        if low is not None:
+            where.append('d.year >= ?')
+            args.append(low)
+        if high is not None:
+            where.append('d.year <= ?')
+            args.append(high)
+        if not len(where):
+            return None
+
+        sql += ' WHERE ' + ' AND '.join(where) + ' ORDER BY d.year DESC'
+        if max_rows is not None:
+            sql += ' LIMIT {}'.format(int(max_rows))
+
+        with self._lock:
+            try:
+                return [i for i, in self._db.execute(sql, args)]
+            except sqlite3.OperationalError:
+                # Not something fts5 can parse
+                return None
@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import hashlib
+import sqlite3
+import threading
+
+from . import utils
+from . import download
+
+# Bytes hashed at a time
+_chunk_size = 1024*1024
+
+# Sub folder of the PDF folder broken downloads are moved to
+_quarantine = '.quarantine'
+
+
+def _hash(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(_chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class store(object):
+    '''
+    The PDF folder, managed so each paper is only on disk once.
+
+    Every file we add is checked to be a whole PDF (see download.is_pdf)
+    and hashed. An index (kept in the metadata cache file) maps each
+    bibcode, including alternate bibcodes such as the arXiv one, to a
+    single file, so the same paper found under another bibcode, or the
+    same content downloaded twice, is not stored again. scrub() checks
+    the whole folder for files that are not PDFs, are cut short or are
+    duplicates, only moving aside broken files we downloaded ourselves.
+    '''
+    def __init__(self, folder=None, filename=None):
+        self._folder = folder
+        if filename is None:
+            filename = utils.settings['CACHE_FILE']
+        self.filename = filename
+
+        os.makedirs(os.path.dirname(self.filename),exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS pdf_files (
+                                filename TEXT PRIMARY KEY,
+                                hash TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                mtime REAL NOT NULL
+                                )''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS pdf_files_hash ON pdf_files (hash)')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS pdf_names (
+                                bibcode TEXT PRIMARY KEY,
+                                filename TEXT NOT NULL
+                                )''')
+            # Small enough to keep in memory, find() is called for every row shown
+            self._names = dict(self._db.execute('SELECT bibcode, filename FROM pdf_names'))
+
+    @property
+    def folder(self):
+        if self._folder is None:
+            return utils.config.get('PDFFOLDER_FILE')
+        return self._folder
+
+    def path(self, bibcode):
+        '''
+        Where the PDF for bibcode goes if we dont have it yet
+        '''
+        return os.path.join(self.folder, bibcode+'.pdf')
+
+    def find(self, bibcode, alternates=()):
+        '''
+        Returns the path of the PDF for bibcode (or any of its alternate
+        bibcodes) or None if we dont have it
+        '''
+        for i in [bibcode] + list(alternates):
+            name = self._names.get(i)
+            if name is not None:
+                path = os.path.join(self.folder, name)
+                if os.path.exists(path):
+                    return path
+
+        # Downloaded before we kept an index
+        path = self.path(bibcode)
+        if os.path.exists(path):
+            return path
+        return None
+
+    def add(self, filename, bibcodes):
+        '''
+        Adds the PDF at filename under each of bibcodes, returns the path to use.
+
+        If we allready have the same content the new copy is removed and
+        the existing one returned. Raises utils.FileDonwnloadFailed if
+        filename is not a whole PDF (it is removed).
+        '''
+        if not download.is_pdf(filename):
+            _remove(filename)
+            raise utils.FileDonwnloadFailed("Not a PDF: {}".format(filename))
+
+        folder = self.folder
+        if folder is None or os.path.dirname(os.path.abspath(filename)) != os.path.abspath(folder):
+            # Not ours to manage
+            return filename
+
+        digest = _hash(filename)
+        name = os.path.basename(filename)
+        stat = os.stat(filename)
+
+        existing = self._duplicate(name, digest)
+        if existing is not None:
+            _remove(filename)
+            name = existing
+        else:
+            self._record(name, digest, stat)
+
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO pdf_names VALUES (?,?)',
+                                [(i, name) for i in bibcodes])
+            for i in bibcodes:
+                self._names[i] = name
+
+        return os.path.join(self.folder, name)
+
+    def _duplicate(self, name, digest):
+        # Another file we have with the same content, or None
+        with self._lock:
+            for existing, in self._db.execute('SELECT filename FROM pdf_files WHERE hash = ?', (digest,)):
+                if existing != name and os.path.exists(os.path.join(self.folder, existing)):
+                    return existing
+        return None
+
+    def _record(self, name, digest, stat):
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO pdf_files VALUES (?,?,?,?)',
+                            (name, digest, stat.st_size, stat.st_mtime))
+
+    def _forget(self, name):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM pdf_files WHERE filename = ?', (name,))
+            self._db.execute('DELETE FROM pdf_names WHERE filename = ?', (name,))
+            for k in [k for k, v in self._names.items() if v == name]:
+                del self._names[k]
+
+    def remove(self, filename):
+        '''
+        Deletes filename and forgets every bibcode pointing at it
+        '''
+        name = os.path.basename(filename)
+        _remove(os.path.join(self.folder, name))
+        self._forget(name)
+
+    def quarantine(self, filename):
+        '''
+        Moves filename into the quarantine sub folder and forgets it, returns its new path
+        '''
+        name = os.path.basename(filename)
+        folder = os.path.join(self.folder, _quarantine)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, name)
+        os.replace(os.path.join(self.folder, name), path)
+        self._forget(name)
+        return path
+
+    def scrub(self):
+        '''
+        Checks every PDF in the folder for files that are not whole PDFs
+        (error pages, broken downloads) and duplicate copies of the same
+        content. Files not changed since they were last checked are
+        skipped.
+
+        Nothing is deleted: broken files we downloaded are moved to the
+        quarantine sub folder, anything else (ie PDFs the user put there)
+        is only reported. Returns a dict of what was found, meant to be
+        run in a background thread.
+        '''
+        result = {'checked': 0, 'corrupt': [], 'duplicate': [], 'quarantined': []}
+        folder = self.folder
+        if folder is None or not os.path.isdir(folder):
+            return result
+
+        with self._lock:
+            known = {name:(size, mtime) for name, size, mtime in
+                        self._db.execute('SELECT filename, size, mtime FROM pdf_files')}
+        ours = set(known) | set(self._names.values())
+
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not name.endswith('.pdf') or not os.path.isfile(path):
+                continue
+
+            stat = os.stat(path)
+            if known.get(name) == (stat.st_size, stat.st_mtime):
+                continue
+
+            result['checked'] += 1
+            if not download.is_pdf(path):
+                result['corrupt'].append(name)
+                if name in ours:
+                    self.quarantine(path)
+                    result['quarantined'].append(name)
+                continue
+
+            digest = _hash(path)
+            if self._duplicate(name, digest) is not None:
+                result['duplicate'].append(name)
+                continue
+
+            self._record(name, digest, stat)
+            if name not in ours:
+                # Files saved before the index existed are named after their bibcode
+                bibcode = name[:-len('.pdf')]
+                with self._lock, self._db:
+                    self._db.execute('INSERT OR IGNORE INTO pdf_names VALUES (?,?)', (bibcode, name))
+                    self._names.setdefault(bibcode, name)
+
+        # Forget files that have gone
+        for name in set(self._names.values()) | set(known):
+            if not os.path.exists(os.path.join(folder, name)):
+                self._forget(name)
+
+        return result
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,118 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import re
+
+# 19 character ADS bibcode: YYYYJJJJJVVVVMPPPPA
+_bibcode = re.compile(r'^\d{4}[A-Za-z&.]{5}[\w.&]{4}[A-Za-z.\d][\d.]{4}[A-Z.]$')
+
+# New (1234.56789v2) and old (astro-ph/0101001v1) style arXiv ids
+_arxiv = re.compile(r'^(?:arxiv:)?(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?$', re.IGNORECASE)
+
+# Query terms we can look up by id, and what to look them up as
+_kinds = {
+    'bibcode': 'bibcode',
+    'identifier': 'identifier',
+    'arxiv': 'identifier',
+    'doi': 'identifier',
+}
+
+
+def normalize(identifier):
+    '''
+    Returns identifier in the form the metadata cache indexes it by:
+    lower case, with any arXiv: prefix and version number removed
+    '''
+    identifier = identifier.strip().strip('"')
+    m = _arxiv.match(identifier)
+    if m:
+        return m.group(1).lower()
+    return identifier.lower()
+
+
+def parse(query):
+    '''
+    Splits a query that only looks up articles by id into a list of
+    (kind, id) in order, where kind is 'bibcode' or 'identifier'.
+
+    Understands bibcode:, identifier:, arxiv: and doi: terms joined by OR,
+    as well as bare lists of bibcodes or arXiv ids. Returns None for
+    anything else, which must go to ADS as is.
+    '''
+    terms = []
+    for token in re.split(r'[\s,]+', query.strip()):
+        if not len(token) or token == 'OR':
+            continue
+
+        field, sep, value = token.partition(':')
+        if sep and field.lower() in _kinds:
+            value = value.strip('"')
+            if not len(value):
+                return None
+            terms.append((_kinds[field.lower()], value))
+        elif _bibcode.match(token.strip('"')):
+            terms.append(('bibcode', token.strip('"')))
+        elif _arxiv.match(token.strip('"')):
+            terms.append(('identifier', token.strip('"')))
+        else:
+            return None
+
+    if not len(terms):
+        return None
+    return terms
+
+
+class planner(object):
+    '''
+    Answers id lookups from the metadata cache, only asking ADS for the
+    ids the cache can not resolve, and merges both into one result.
+    '''
+    # Fetched alongside misses so the cache learns their ids
+    id_fields = ['identifier', 'alternate_bibcode']
+
+    def __init__(self, search):
+        self.search = search
+        self.adsdata = search.adsdata
+
+    def run(self, terms):
+        '''
+        Returns (bibcodes, docs) for terms (see parse()), in the order asked
+        for, followed by anything else ADS returned for them
+        '''
+        idents = [v for k, v in terms if k == 'identifier']
+        resolved = self.adsdata.cache.resolve(idents)
+
+        extra = {}
+        missing = [i for i in idents if normalize(i) not in resolved]
+        if len(missing):
+            fields = list(self.search.fields) + [i for i in self.id_fields if i not in self.search.fields]
+            s = type(self.search)(self.adsdata, max_rows=self.search.max_rows, fields=fields)
+            for query in s.chunked_join(missing, prefix='identifier:', joiner=' OR '):
+                _, data = s._query(query)
+                for doc in data:
+                    extra[doc['bibcode']] = doc
+            resolved = self.adsdata.cache.resolve(idents)
+
+        wanted = []
+        for kind, value in terms:
+            if kind == 'bibcode':
+                wanted.append(value)
+            elif normalize(value) in resolved:
+                wanted.append(resolved[normalize(value)])
+        wanted = list(dict.fromkeys(wanted))
+
+        # Local hits come from the cache, the rest by bibcode from ADS
+        found = self.search.fetch(wanted)
+
+        bibcodes = [i for i in wanted if i in found]
+        seen = set(bibcodes)
+        bibcodes.extend(i for i in found if i not in seen)
+        bibcodes.extend(i for i in extra if i not in found)
+
+        docs = []
+        for i in bibcodes:
+            if i in found:
+                docs.append(found[i])
+            else:
+                docs.append({k: v for k, v in extra[i].items() if k in self.search.fields})
+
+        return bibcodes, docs
@@ -0,0 +1,183 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import time
+import threading
+import collections
+
+from . import articles
+from . import download
+
+# Downloads running at once
+_max_workers = 3
+
+# Times to try again after a failed download
+_retries = 3
+
+# Seconds to wait before the first retry, doubling each time
+_backoff = 5.0
+
+
+class queue(object):
+    '''
+    Background downloader for the PDFs of whole journals or libraries.
+
+    add() queues every article whose PDF is not in the PDF folder yet,
+    which max_workers threads then download as background work (so they
+    give way to interactive requests when the ADS quota runs low), politely
+    (see download.hosts) and retrying failures with exponential backoff.
+    Opening a PDF that is being prefetched starts its own download (see
+    article.pdf) so the user never waits on the queue's politeness delays
+    or quota limits.
+
+    progress, if given, is called with status() from a worker thread
+    whenever something finishes.
+    '''
+    def __init__(self, adsdata, max_workers=_max_workers, retries=_retries,
+                backoff=_backoff, progress=None):
+        self.adsdata = adsdata
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+        self.hosts = download.hosts()
+
+        self._cond = threading.Condition()
+        # (bibcode, attempt, time it can start)
+        self._pending = collections.deque()
+        self._queued = set()
+        self._active = set()
+        self._workers = []
+        self._paused = False
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+
+    def add(self, papers):
+        '''
+        Queues the PDFs for papers, a journal, library or list of
+        articles or bibcodes. Returns how many were queued.
+        '''
+        if isinstance(papers, articles.journal):
+            bibcodes = papers.bibcodes()
+        elif hasattr(papers, 'keys'):
+            bibcodes = list(papers.keys())
+        else:
+            bibcodes = [getattr(i, 'bibcode', i) for i in papers]
+
+        new = []
+        for i in bibcodes:
+            if i in self._queued:
+                continue
+            if os.path.exists(articles.article(self.adsdata, bibcode=i).filename(True)):
+                continue
+            new.append(i)
+
+        with self._cond:
+            for i in new:
+                if i not in self._queued:
+                    self._pending.append((i, 0, 0))
+                    self._queued.add(i)
+                    self.total += 1
+            self._start_workers()
+            self._cond.notify_all()
+
+        return len(new)
+
+    def _start_workers(self):
+        self._workers = [i for i in self._workers if i.is_alive()]
+        while len(self._workers) < min(self.max_workers, len(self._pending)):
+            t = threading.Thread(target=self._worker)
+            t.daemon = True
+            t.start()
+            self._workers.append(t)
+
+    def pause(self):
+        '''
+        Stops starting new downloads (those running are allowed to finish)
+        '''
+        with self._cond:
+            self._paused = True
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def clear(self):
+        '''
+        Forgets everything not yet started
+        '''
+        with self._cond:
+            for i in self._pending:
+                self._queued.discard(i[0])
+            self.total -= len(self._pending)
+            self._pending.clear()
+
+    def status(self):
+        with self._cond:
+            return {
+                'total': self.total,
+                'done': self.done,
+                'failed': self.failed,
+                'active': len(self._active),
+                'pending': len(self._pending),
+                'paused': self._paused,
+            }
+
+    def _next(self):
+        # Waits for the next download we are allowed to start, None once idle
+        with self._cond:
+            while True:
+                if not len(self._pending):
+                    return None
+
+                if not self._paused:
+                    now = time.monotonic()
+                    for item in self._pending:
+                        if item[2] <= now:
+                            self._pending.remove(item)
+                            self._active.add(item[0])
+                            return item
+                    wait = min(i[2] for i in self._pending) - now
+                else:
+                    wait = None
+
+                self._cond.wait(wait)
+
+    def _worker(self):
+        with self.adsdata.limits.background():
+            while True:
+                item = self._next()
+                if item is None:
+                    return
+                self._download(*item)
+
+    def _download(self, bibcode, attempt, _):
+        paper = articles.article(self.adsdata, bibcode=bibcode)
+        try:
+            paper.pdf(paper.filename(True), hosts=self.hosts)
+            ok = True
+        except Exception:
+            # Whatever went wrong, count it as a failed attempt so the queue keeps going
+            ok = False
+
+        with self._cond:
+            self._active.discard(bibcode)
+            if ok:
+                self.done += 1
+                self._queued.discard(bibcode)
+            elif attempt < self.retries:
+                self._pending.append((bibcode, attempt + 1,
+                                    time.monotonic() + self.backoff * 2**attempt))
+                self._cond.notify_all()
+            else:
+                self.failed += 1
+                self._queued.discard(bibcode)
+
+        if self.progress is not None:
+            self.progress(self.status())
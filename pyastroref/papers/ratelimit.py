@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import time
+import datetime
+import threading
+import contextlib
+import email.utils
+import urllib.parse
+
+from . import utils
+
+# Only responses from here count against the ADS quota
+_host = 'api.adsabs.harvard.edu'
+
+# Seconds to wait after a 429 that does not say when to try again
+_backoff = 600.0
+
+# ADS's default daily allowance
+_max_limit = 5000
+
+# Below this fraction of the allowance background work is slowed down
+_throttle = 0.2
+
+# Below this fraction of the allowance background work is refused,
+# leaving the rest for things the user asked for
+_reserve = 0.05
+
+# Longest delay (in seconds) added to a background request
+_max_delay = 5.0
+
+
+def counts(url):
+    '''
+    True if a request to url uses up ADS api quota
+    '''
+    return urllib.parse.urlsplit(url).hostname == _host
+
+
+class governor(object):
+    '''
+    Process wide accounting of the ADS api quota.
+
+    Every ADS api response that goes through an ADSSession updates the
+    remaining quota from its X-RateLimit headers (a 429 without them
+    pauses us for Retry-After or _backoff seconds), and every request asks wait()
+    first. Interactive requests are only stopped once ADS has told us we
+    are out, background requests (see background()) are slowed down as
+    the quota runs low and refused once we are into the reserve.
+    '''
+    def __init__(self, limit=_max_limit):
+        self.limit = limit
+        self.remaining = limit
+        self._reset = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def counts(self, url):
+        return counts(url)
+
+    @property
+    def reset(self):
+        '''
+        When ADS will next reset the quota (as a datetime) or None if unknown
+        '''
+        if self._reset is None:
+            return None
+        return datetime.datetime.fromtimestamp(self._reset)
+
+    def update(self, response, *args, **kwargs):
+        '''
+        Records the quota from a response, can be used as a requests response hook
+        '''
+        if not counts(response.url):
+            # PDF mirrors, publishers etc have their own limits
+            return response
+
+        headers = response.headers
+        with self._lock:
+            try:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+                self.limit = int(headers['X-RateLimit-Limit'])
+            except (KeyError, ValueError):
+                pass
+            try:
+                self._reset = float(headers['X-RateLimit-Reset'])
+            except (KeyError, ValueError):
+                pass
+            if response.status_code == 429:
+                self.remaining = 0
+                if self._reset is None or self._reset <= time.time():
+                    self._reset = time.time() + _retry_after(headers)
+        return response
+
+    def _check_reset(self):
+        if self._reset is not None and time.time() >= self._reset:
+            self.remaining = self.limit
+            self._reset = None
+
+    def delay(self, background=None):
+        '''
+        Returns how long (in seconds) a request should wait before being sent.
+
+        Raises utils.RateLimitError if it should not be sent at all.
+        '''
+        if background is None:
+            background = self.is_background()
+
+        with self._lock:
+            self._check_reset()
+            remaining = self.remaining
+            fraction = remaining / max(self.limit, 1)
+
+        if remaining <= 0:
+            raise utils.RateLimitError('ADS quota used up, resets at {}'.format(self.reset))
+
+        if not background or fraction > _throttle:
+            return 0
+
+        if fraction <= _reserve:
+            raise utils.RateLimitError('ADS quota low, background requests paused until {}'.format(self.reset))
+
+        return _max_delay * (_throttle - fraction) / (_throttle - _reserve)
+
+    def wait(self, background=None):
+        t = self.delay(background)
+        if t > 0:
+            time.sleep(t)
+
+    def is_background(self):
+        return getattr(self._local, 'background', False)
+
+    @contextlib.contextmanager
+    def background(self, on=True):
+        '''
+        Marks requests made by this thread, inside the with block, as background work
+        '''
+        old = self.is_background()
+        self._local.background = on
+        try:
+            yield
+        finally:
+            self._local.background = old
+
+
+def _retry_after(headers):
+    # Retry-After is either seconds or an http date
+    value = headers.get('Retry-After')
+    if value is None:
+        return _backoff
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return _backoff
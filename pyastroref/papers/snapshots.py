@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from . import utils
+
+# Library metadata that changes whenever its documents do
+_change_keys = ['num_documents', 'date_last_modified']
+
+
+def changed(old, new):
+    '''
+    True if library metadata new says the documents differ from when old was fetched
+    '''
+    return any(old.get(i) != new.get(i) for i in _change_keys)
+
+
+def apply(documents, action, bibcodes):
+    '''
+    Returns the list documents with bibcodes added or removed
+    '''
+    documents = list(documents)
+    if action == 'add':
+        have = set(documents)
+        for i in bibcodes:
+            if i not in have:
+                documents.append(i)
+                have.add(i)
+        return documents
+    remove = set(bibcodes)
+    return [i for i in documents if i not in remove]
+
+
+class snapshots(object):
+    '''
+    Local (sqlite) copy of each ADS library's bibcodes and metadata,
+    so a library only needs downloading again when ADS says it changed.
+    '''
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = utils.settings['CACHE_FILE']
+        self.filename = filename
+
+        os.makedirs(os.path.dirname(self.filename),exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS library_snapshots (
+                                libraryid TEXT PRIMARY KEY,
+                                metadata TEXT NOT NULL,
+                                bibcodes TEXT NOT NULL,
+                                synced REAL NOT NULL
+                                )''')
+
+    def get(self, libraryid):
+        '''
+        Returns (metadata, bibcodes) for libraryid or None if we have no copy
+        '''
+        with self._lock:
+            row = self._db.execute('SELECT metadata, bibcodes FROM library_snapshots WHERE libraryid = ?',
+                                    (libraryid,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, libraryid, metadata, bibcodes):
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO library_snapshots VALUES (?,?,?,?)',
+                            (libraryid, json.dumps(metadata), json.dumps(list(bibcodes)), time.time()))
+
+    def remove(self, libraryid):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM library_snapshots WHERE libraryid = ?', (libraryid,))
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM library_snapshots')
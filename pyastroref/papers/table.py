@@ -0,0 +1,112 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import numpy as np
+
+
+class columns(object):
+    '''
+    Column oriented view of a list of articles, for fast sorting and filtering.
+
+    Numeric fields are held as numpy arrays, string fields as integer codes
+    into a sorted array of their distinct values (so sorting the codes sorts
+    the strings). Every operation returns an array of indices into the
+    original list of articles.
+    '''
+    numeric = ['year', 'citation_count', 'reference_count']
+    strings = ['bibstem', 'first_author']
+
+    def __init__(self, papers):
+        papers = list(papers)
+        self.bibcodes = np.array([i.bibcode for i in papers], dtype=object)
+
+        self._data = {}
+        self._data['year'] = np.array([_int(i.year) for i in papers], dtype=np.int32)
+        self._data['citation_count'] = np.array([_int(i.citation_count) for i in papers], dtype=np.int32)
+        self._data['reference_count'] = np.array([_int(i.reference_count) for i in papers], dtype=np.int32)
+
+        self._categories = {}
+        for name, values in [('bibstem', [i.journal for i in papers]),
+                             ('first_author', [i.first_author for i in papers])]:
+            cats, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+            self._categories[name] = cats
+            self._data[name] = codes.astype(np.int32)
+
+    def __len__(self):
+        return len(self.bibcodes)
+
+    def __getitem__(self, name):
+        '''
+        Returns the column name, decoded back to strings for string columns
+        '''
+        if name in self._categories:
+            return self._categories[name][self._data[name]]
+        return self._data[name]
+
+    def _key(self, name):
+        if name not in self._data:
+            raise KeyError('No column called {}'.format(name))
+        return self._data[name]
+
+    def sort(self, name, descending=False):
+        '''
+        Returns the indices that sort by column name (stable)
+        '''
+        key = self._key(name)
+        if descending:
+            key = -key.astype(np.int64)
+        return np.argsort(key, kind='stable')
+
+    def rank(self, name, descending=False):
+        '''
+        Returns each row's position when sorted by column name
+        '''
+        order = self.sort(name, descending)
+        result = np.empty_like(order)
+        result[order] = np.arange(len(order))
+        return result
+
+    def top(self, name, num):
+        '''
+        Returns the indices of the num largest values of column name, largest first
+        '''
+        key = self._key(name)
+        if num <= 0:
+            return np.array([], dtype=np.intp)
+        if num < len(key):
+            idx = np.argpartition(-key.astype(np.int64), num-1)[:num]
+        else:
+            idx = np.arange(len(key))
+        return idx[np.argsort(-key[idx].astype(np.int64), kind='stable')]
+
+    def filter(self, **kwargs):
+        '''
+        Returns the indices (in order) of rows matching every keyword:
+
+        Numeric columns take a (min, max) tuple, inclusive, either of which
+        may be None, string columns take a value or list of values:
+
+            filter(year=(2000, 2010), citation_count=(100, None), bibstem='ApJ')
+        '''
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in kwargs.items():
+            key = self._key(name)
+            if name in self._categories:
+                if isinstance(value, str):
+                    value = [value]
+                cats = self._categories[name]
+                wanted = np.flatnonzero(np.isin(cats, value))
+                mask &= np.isin(key, wanted)
+            else:
+                low, high = value
+                if low is not None:
+                    mask &= key >= low
+                if high is not None:
+                    mask &= key <= high
+        return np.flatnonzero(mask)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
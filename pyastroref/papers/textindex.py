@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import threading
+
+
+class textindex(object):
+    '''
+    In memory n-gram index over a growing list of articles, for search as you type.
+
+    Articles are numbered in the order they are add()ed. search(query)
+    returns the numbers of those whose title, abstract (part of the list
+    profile, so loaded with the rest of the row), authors or year contain
+    query, the same as a substring scan would. When a query extends the
+    previous one only the previous matches (plus any articles added since)
+    are checked again.
+
+    Adding can happen in one thread (ie the one downloading the articles)
+    while another searches.
+    '''
+    def __init__(self, ngram=3):
+        self.ngram = ngram
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._texts = []
+            self._postings = {}
+            self._last_query = None
+            self._last_result = []
+            self._last_size = 0
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _text(self, paper):
+        fields = [paper.title, paper.peek('abstract') or '', paper.authors, paper.year]
+        # Seperate the fields so a query can not match across two of them
+        return '\n'.join(fields).lower()
+
+    def _grams(self, text):
+        n = self.ngram
+        return {text[i:i+n] for i in range(len(text)-n+1)}
+
+    def add(self, papers):
+        '''
+        Adds papers to the end of the index, returns their numbers
+        '''
+        texts = [self._text(i) for i in papers]
+        with self._lock:
+            start = len(self._texts)
+            for idx, text in enumerate(texts, start):
+                self._texts.append(text)
+                for gram in self._grams(text):
+                    self._postings.setdefault(gram, []).append(idx)
+            return list(range(start, len(self._texts)))
+
+    def search(self, query):
+        '''
+        Returns the numbers, in order, of the articles matching query
+        '''
+        query = query.lower()
+        with self._lock:
+            size = len(self._texts)
+            if not len(query):
+                result = list(range(size))
+            else:
+                if self._last_query is not None and self._last_query in query:
+                    # Narrowing the last search
+                    candidates = self._last_result + list(range(self._last_size, size))
+                elif len(query) >= self.ngram:
+                    candidates = self._candidates(query)
+                else:
+                    candidates = range(size)
+
+                result = [i for i in candidates if query in self._texts[i]]
+
+            self._last_query = query
+            self._last_result = result
+            self._last_size = size
+
+        return result
+
+    def _candidates(self, query):
+        # Articles holding every n-gram of query, rarest n-gram first
+        postings = []
+        for gram in self._grams(query):
+            if gram not in self._postings:
+                return []
+            postings.append(self._postings[gram])
+
+        postings.sort(key=len)
+        result = set(postings[0])
+        for i in postings[1:]:
+            result.intersection_update(i)
+            if not len(result):
+                break
+        return sorted(result)
@@ -4,6 +4,8 @@ import os
 import re
 import requests
 import datetime
+import threading
+import concurrent.futures
 from pathlib import Path
 from appdirs import AppDirs
 
@@ -22,6 +24,8 @@ settings = {
     'JOURNALS_LIST':os.path.join(dirs.user_config_dir,'journals'),
     # Dark mode?
     'DARK_MODE_FILE':os.path.join(dirs.user_config_dir,'dark_mode'),
+    # Where to cache article metadata
+    'CACHE_FILE':os.path.join(dirs.user_cache_dir,'metadata.sqlite'),
 }
 
 
@@ -40,8 +44,11 @@ urls = {
 
 def save_key_file(filename,key):
     os.makedirs(os.path.dirname(filename),exist_ok=True)
-    with open(filename,'w') as f:
+    # Write then rename so a reader never sees half a file
+    tmp = filename + '.tmp'
+    with open(tmp,'w') as f:
         print(key,file=f)
+    os.replace(tmp, filename)
 
 def read_key_file(filename):
     os.makedirs(os.path.dirname(filename),exist_ok=True) # Handle making folders on first run
@@ -53,6 +60,150 @@ def read_key_file(filename):
     return result
 
 
+class Config(object):
+    '''
+    The values of the settings files, read once and then held in memory.
+
+    get() never touches the disk after the first read of each setting,
+    set() updates memory and writes the file atomically. Functions
+    registered with watch() are called with the new value whenever a
+    setting changes, either through set() or, when reload() is called,
+    because the file was changed by someone else.
+    '''
+    def __init__(self, files):
+        self._files = files
+        self._lock = threading.RLock()
+        self._values = {}
+        self._mtimes = {}
+        self._watchers = {}
+
+    def _mtime(self, name):
+        try:
+            return os.path.getmtime(self._files[name])
+        except OSError:
+            return None
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._values:
+                self._mtimes[name] = self._mtime(name)
+                self._values[name] = read_key_file(self._files[name])
+            return self._values[name]
+
+    def set(self, name, value):
+        with self._lock:
+            save_key_file(self._files[name], value)
+            self._mtimes[name] = self._mtime(name)
+            changed = self._values.get(name) != str(value)
+            self._values[name] = str(value)
+        if changed:
+            self._notify(name)
+
+    def watch(self, name, func):
+        '''
+        Calls func(value) whenever setting name changes
+        '''
+        with self._lock:
+            self._watchers.setdefault(name, []).append(func)
+
+    def reload(self):
+        '''
+        Re-reads any settings file changed on disk since we last read it
+        '''
+        changed = []
+        with self._lock:
+            for name in list(self._values):
+                mtime = self._mtime(name)
+                if mtime != self._mtimes.get(name):
+                    self._mtimes[name] = mtime
+                    value = read_key_file(self._files[name])
+                    if value != self._values[name]:
+                        self._values[name] = value
+                        changed.append(name)
+        for name in changed:
+            self._notify(name)
+
+    def _notify(self, name):
+        value = self.get(name)
+        for func in list(self._watchers.get(name, [])):
+            func(value)
+
+
+# Every setting file's value, see Config
+config = Config(settings)
+
+
+# Default (connect, read) timeouts in seconds for network calls
+_timeout = (10, 60)
+
+# Number of connections to keep alive per host
+_pool_size = 10
+
+
+class ADSSession(requests.Session):
+    '''
+    A requests session that keeps connections alive between calls.
+
+    All ADS traffic should go through one of these (see adsabs.session) so
+    that we only pay for the TCP+TLS handshake once per connection rather
+    than once per request.
+    '''
+    def __init__(self, timeout=_timeout, pool_size=_pool_size, limits=None):
+        super().__init__()
+        self.timeout = timeout
+        self.limits = limits
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers.update({'Accept-Encoding':'gzip, deflate'})
+        if self.limits is not None:
+            self.hooks['response'].append(self.limits.update)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.limits is not None and self.limits.counts(url):
+            self.limits.wait()
+        return super().request(method, url, **kwargs)
+
+
+class SingleFlight(object):
+    '''
+    Coalesces identical calls that are in flight at the same time.
+
+    The first caller of do(key, ...) runs func, anyone else asking for the
+    same key before it finishes waits for, and shares, that result (or
+    exception) instead of making their own network call.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+        return result
+
+
 # Handles setting the ADS dev token during a request call
 # Use as requests.get(url,auth=_BearerAuth(ADS_TOKEN)
 class BearerAuth(requests.auth.AuthBase):
@@ -64,4 +215,8 @@ class BearerAuth(requests.auth.AuthBase):
 
 
 class FileDonwnloadFailed(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class RateLimitError(Exception):
+    pass
@@ -0,0 +1,206 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import os
+import time
+import sqlite3
+import threading
+
+import requests
+
+from . import utils
+from . import libraries
+from . import snapshots
+
+# Seconds to wait for more changes before sending them
+_delay = 2.0
+
+# Seconds to wait before trying again while offline or rate limited, doubling up to _max_backoff
+_backoff = 30.0
+_max_backoff = 600.0
+
+
+def merge(ops):
+    '''
+    Merges a list of (libraryid, action, bibcode), in order, into
+    {libraryid: {'add':[...], 'remove':[...]}}, the last action
+    on each bibcode winning
+    '''
+    final = {}
+    for lid, action, bibcode in ops:
+        lib = final.setdefault(lid, {})
+        lib.pop(bibcode, None)
+        lib[bibcode] = action
+
+    result = {}
+    for lid, lib in final.items():
+        result[lid] = {'add': [], 'remove': []}
+        for bibcode, action in lib.items():
+            result[lid][action].append(bibcode)
+    return result
+
+
+class queue(object):
+    '''
+    Write behind queue for adding and removing library documents.
+
+    Changes are saved to disk and applied to the local library snapshots
+    straight away, then sent to ADS in the background a few seconds
+    later, merged into one add and one remove request per library. If
+    ADS can not be reached (or we are rate limited) they stay queued and
+    are sent later, in order, even after a restart.
+
+    on_error, if set, is called with the exception (from the background
+    thread) when ADS rejects a change, which is then dropped and the
+    library synced again to undo it locally.
+    '''
+    def __init__(self, adsdata, filename=None, delay=_delay):
+        self.adsdata = adsdata
+        self.delay = delay
+        self.on_error = None
+        if filename is None:
+            filename = utils.settings['CACHE_FILE']
+        self.filename = filename
+
+        os.makedirs(os.path.dirname(self.filename),exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('''CREATE TABLE IF NOT EXISTS library_writes (
+                                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                libraryid TEXT NOT NULL,
+                                action TEXT NOT NULL,
+                                bibcode TEXT NOT NULL
+                                )''')
+
+        self._cond = threading.Condition()
+        # Only one flush() sends at a time
+        self._sending = threading.Lock()
+        self._thread = None
+        self._wake = None
+        self._backoff = _backoff
+
+        if len(self.pending()):
+            # Left over from last time
+            self.schedule(0)
+
+    def add(self, libraryid, bibcodes):
+        self._queue(libraryid, 'add', bibcodes)
+
+    def remove(self, libraryid, bibcodes):
+        self._queue(libraryid, 'remove', bibcodes)
+
+    def _queue(self, libraryid, action, bibcodes):
+        bibcodes = list(bibcodes)
+        with self._lock, self._db:
+            self._db.executemany('INSERT INTO library_writes (libraryid, action, bibcode) VALUES (?,?,?)',
+                                [(libraryid, action, i) for i in bibcodes])
+
+        # So the ui sees the change now rather than after the round trip
+        snapshot = self.adsdata.snapshots.get(libraryid)
+        if snapshot is not None:
+            metadata, documents = snapshot
+            self.adsdata.snapshots.put(libraryid, metadata, snapshots.apply(documents, action, bibcodes))
+
+        self.schedule(self.delay)
+
+    def pending(self, libraryid=None):
+        '''
+        Returns the queued (libraryid, action, bibcode), oldest first
+        '''
+        with self._lock:
+            if libraryid is None:
+                rows = self._db.execute('SELECT libraryid, action, bibcode FROM library_writes ORDER BY seq')
+            else:
+                rows = self._db.execute('SELECT libraryid, action, bibcode FROM library_writes WHERE libraryid = ? ORDER BY seq',
+                                        (libraryid,))
+            return rows.fetchall()
+
+    def overlay(self, libraryid, documents):
+        '''
+        Returns documents (as downloaded from ADS) with our unsent changes applied
+        '''
+        for _, action, bibcode in self.pending(libraryid):
+            documents = snapshots.apply(documents, action, [bibcode])
+        return documents
+
+    def schedule(self, delay):
+        '''
+        Sends the queue in delay seconds (or sooner if allready due)
+        '''
+        with self._cond:
+            self._wake = delay if self._wake is None else min(self._wake, delay)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._wake is None:
+                    self._cond.wait()
+                # Wait out the delay, bringing it forward if something sooner comes in
+                deadline = None
+                while True:
+                    now = time.monotonic()
+                    if self._wake is not None:
+                        wake = now + self._wake
+                        deadline = wake if deadline is None else min(deadline, wake)
+                        self._wake = None
+                    if now >= deadline:
+                        break
+                    self._cond.wait(deadline - now)
+
+            with self.adsdata.limits.background():
+                if self.flush():
+                    self._backoff = _backoff
+                else:
+                    self.schedule(self._backoff)
+                    self._backoff = min(self._backoff*2, _max_backoff)
+
+    def flush(self):
+        '''
+        Sends everything queued, returns False if ADS could not be reached
+        '''
+        with self._sending:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            rows = self._db.execute('SELECT seq, libraryid, action, bibcode FROM library_writes ORDER BY seq').fetchall()
+        if not len(rows):
+            return True
+
+        last = rows[-1][0]
+        done = []
+        rejected = []
+        for lid, actions in merge([i[1:] for i in rows]).items():
+            lib = libraries.library(self.adsdata, lid)
+            try:
+                for action in ('remove', 'add'):
+                    if len(actions[action]):
+                        lib.post(action, actions[action])
+            except (utils.RateLimitError, requests.RequestException):
+                # Keep this library's changes (and the rest) for next time
+                self._forget(done, last, rejected)
+                return False
+            except ValueError as e:
+                rejected.append(lid)
+                if self.on_error is not None:
+                    self.on_error(e)
+            done.append(lid)
+
+        self._forget(done, last, rejected)
+        return True
+
+    def _forget(self, libraryids, last, rejected=()):
+        # Changes queued while we were sending have a later seq and are kept
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM library_writes WHERE seq <= ? AND libraryid = ?',
+                                [(last, i) for i in libraryids])
+        for lid in rejected:
+            # What we showed locally never happened on ADS
+            self.adsdata.libraries.resync(lid)
+
@@ -28,16 +28,28 @@ class JournalWindow(Gtk.Window):
         self.search = Gtk.SearchEntry()
         self.search.connect("changed", self.refresh_results)
 
-        self.vbox.pack_start(self.search, False, False,0)
+        self.anywhere = Gtk.CheckButton(label="Match anywhere")
+        self.anywhere.connect("toggled", self.refresh_results)
+
+        self.hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+        self.hbox.pack_start(self.search, True, True,0)
+        self.hbox.pack_start(self.anywhere, False, False,0)
+
+        self.vbox.pack_start(self.hbox, False, False,0)
 
         self.scroll=Gtk.ScrolledWindow(hexpand=True, vexpand=True)
 
+        # Every journal is added once, searching only hides and shows rows
         self.store = Gtk.ListStore(str, bool)
+        self._visible = None
         self.make_rows()
 
+        self.filter = self.store.filter_new()
+        self.filter.set_visible_func(self.is_visible)
+
         self.set_size_request(1200,400)
 
-        self.treeview = Gtk.TreeView(model=self.store)
+        self.treeview = Gtk.TreeView(model=self.filter)
         renderer_text = Gtk.CellRendererText()
         column_text = Gtk.TreeViewColumn("Journal", renderer_text, text=0)
         self.treeview.append_column(column_text)
@@ -65,6 +77,7 @@ class JournalWindow(Gtk.Window):
         self.connect('delete-event', self.on_destroy)
 
     def on_cell_toggled(self, widget, path):
+        path = self.filter.convert_path_to_child_path(Gtk.TreePath(path))
         name = self.store[path][0]
         state = self.store[path][1]
         # Toggle-off
@@ -80,24 +93,26 @@ class JournalWindow(Gtk.Window):
             adsJournals.all_journals.pop(name,None)
 
     def refresh_results(self, widget):
-        query = self.search.get_text().lower()
-        if not len(query):
-            pass
+        query = self.search.get_text()
+        if not len(query.strip()):
+            self._visible = None
         else:
-            self.store.clear()
-            self.make_rows(query)
+            self._visible = set(adsJournals.find(query, self.anywhere.get_active()))
+        self.filter.refilter()
 
+    def is_visible(self, model, iter, data):
+        return self._visible is None or model[iter][0] in self._visible
 
-    def make_rows(self,query=''):
-        def_journals = sorted(adsJournals.list_defaults(), key=str.lower)
-        all_journals = sorted(adsJournals.list_all(), key=str.lower)
+    def make_rows(self):
+        shown = adsJournals.list_defaults()
+        names = adsJournals.find('')
 
-        for i in def_journals:
-            if i.lower().startswith(query):
+        for i in names:
+            if i in shown:
                 self.store.append([i,True])
 
-        for i in all_journals:
-            if i.lower().startswith(query):
+        for i in names:
+            if i not in shown:
                 self.store.append([i,False])
 
     def on_destroy(self, widget,*data):
@@ -3,6 +3,7 @@
 import os
 import sys
 import threading
+import requests
 
 import gi
 gi.require_version("Gtk", "3.0")
@@ -12,23 +13,50 @@ from . import utils, libraries, pdf, saved_search
 
 from ..papers import adsabs as ads
 from ..papers import articles
+from ..papers import textindex
+from ..papers import utils as papers_utils
+from ..papers import prefetch
 
 adsData = ads.adsabs()
 adsSearch = ads.articles.search(adsData)
 
+
+def _prefetch_progress(status):
+    msg = 'Downloaded {done} of {total} PDFs'.format(**status)
+    if status['failed']:
+        msg += ', {failed} failed'.format(**status)
+    GLib.idle_add(utils.show_status, msg)
+
+# Shared by every tab so downloads are limited across all of them
+prefetcher = prefetch.queue(adsData, progress=_prefetch_progress)
+
 class ShowJournal(Gtk.VBox):
     cols = ["Title", "First Author", "Year", "Authors", "Journal","References", "Citations", 
             "PDF", "Bibtex","bibcode"]
-    def __init__(self, target, notebook, name):
+    # Numeric columns, sorted using the journal's columns() view
+    sort_cols = {2:'year', 5:'reference_count', 6:'citation_count'}
+    # Hidden store column saying whether the row passes the search box
+    visible_col = len(cols)
+    # How long (ms) to wait after the last key press before filtering
+    debounce = 150
+
+    def __init__(self, target, notebook, name, offline=None):
         Gtk.VBox.__init__(self)
         self.has_search_open=False
 
         self.target = target
+        # Answers from the local cache, shown while target runs and
+        # used instead of it if ADS can not be reached
+        self.offline = offline
         self.notebook = notebook
 
-        self.store = Gtk.ListStore(*[str]*len(self.cols))
+        self.store = Gtk.ListStore(*([str]*len(self.cols) + [bool]))
         self.journal = []
         self._journal = []
+        self.index = textindex.textindex()
+        self._shown = set()
+        self._query = ''
+        self._filter_timeout = None
         self.make_liststore(self._journal)
         self.make_treeview()
 
@@ -64,12 +92,59 @@ class ShowJournal(Gtk.VBox):
         def threader():
             self._journal = []
             GLib.idle_add(self.store.clear)
+
+            state = {'index': None, 'rows': 0}
+            def show(papers, new=False):
+                # Index the rows here, off the main loop, then hand them over
+                papers = list(papers)
+                if new or state['index'] is None:
+                    state['index'] = textindex.textindex()
+                    state['rows'] = 0
+                    new = True
+                numbers = state['index'].add(papers)
+                state['rows'] += len(papers)
+                if new:
+                    GLib.idle_add(self.make_liststore,papers,state['index'],numbers)
+                else:
+                    GLib.idle_add(self.append_liststore,papers,numbers)
+
+            local = None
+            if self.offline is not None:
+                # Show what we have seen before straight away, ADS's answer replaces it
+                local = self.offline()
+                if local:
+                    show(local, new=True)
+
             try:
-                self._journal = self.target()
+                result = self.target()
+                if isinstance(result, articles.stream):
+                    # Show each page as soon as it arrives
+                    first = True
+                    for page in result.pages():
+                        show(page, new=first)
+                        first = False
+                    if first:
+                        show([], new=True)
+                    self._journal = result.journal()
+                else:
+                    self._journal = result
+                    show(self._journal, new=True)
             except articles.SearchError:
                 GLib.idle_add(utils.ads_error_window)
-
-            GLib.idle_add(self.make_liststore,self._journal)
+            except (papers_utils.RateLimitError, requests.ConnectionError, requests.Timeout):
+                if self.offline is None:
+                    raise
+                # Answer from what we have seen before
+                self._journal = local or []
+                show(self._journal, new=True)
+
+            if len(self._journal) != state['rows']:
+                # The rows shown dont match the final journal, start again
+                show(self._journal, new=True)
+            if isinstance(self._journal, articles.journal):
+                # Build the column view off the main loop
+                self._journal.columns()
+            GLib.idle_add(self.set_journal,self._journal)
             GLib.idle_add(self.header.spin_off)
             self.header.data = self._journal
 
@@ -77,43 +152,89 @@ class ShowJournal(Gtk.VBox):
         thread.daemon = True
         thread.start()
 
-    def make_liststore(self,journal):
+    def make_row(self, paper):
+        pdficon = 'go-down'
+        if os.path.exists(paper.filename(True)):
+            pdficon = 'x-office-document'
+
+        authors = paper.authors.split(';')[1:]
+        if len(authors) > 3:
+            authors = authors[0:3]
+            authors.append('et al')
+        authors = '; '.join([i.strip() for i in authors])
+
+        return [
+            paper.title,
+            paper.first_author,
+            paper.year,
+            authors,
+            paper.journal,
+            str(paper.reference_count),
+            str(paper.citation_count),
+            pdficon,
+            'edit-copy',
+            paper.bibcode,
+            True
+        ]
+
+    def make_liststore(self,journal,index=None,numbers=None):
         self.store.clear()
-        # Creating the ListStore model
-        for paper in journal:
-            pdficon = 'go-down'
-            if os.path.exists(paper.filename(True)):
-                pdficon = 'x-office-document'
-
-            authors = paper.authors.split(';')[1:]
-            if len(authors) > 3:
-                authors = authors[0:3]
-                authors.append('et al')
-            authors = '; '.join([i.strip() for i in authors])
-
-            self.store.append([
-                paper.title,
-                paper.first_author,
-                paper.year,
-                authors,
-                paper.journal,
-                str(paper.reference_count),
-                str(paper.citation_count),
-                pdficon,
-                'edit-copy',
-                paper.bibcode
-            ])
-
-        self.journal = journal
-        utils.show_status('Showing {} articles'.format(len(self.journal)))
+        self.journal = []
+        # index is built by the download thread, numbers being journal's rows in it
+        self.index = index if index is not None else textindex.textindex()
+        self._shown = set()
+        self.append_liststore(journal,numbers)
 
+    def append_liststore(self,journal,numbers=None):
+        # Creating the ListStore model, row i is self.journal[i]
+        for paper in journal:
+            self.store.append(self.make_row(paper))
+            self.journal.append(paper)
+
+        if numbers is None:
+            numbers = self.index.add(journal)
+        self._shown.update(numbers)
+        if len(self._query):
+            self.apply_filter()
+        else:
+            utils.show_status('Showing {} articles'.format(len(self.journal)))
 
+    def set_journal(self,journal):
+        self.make_ranks(journal)
+        # Swap the list of rows for the full journal without rebuilding the store
+        if len(journal) == len(self.journal):
+            self.journal = journal
+        else:
+            self.make_liststore(journal)
 
     def make_treeviewsort(self):
-        self.treeviewsorted = Gtk.TreeModelSort(model=self.store)
-        self.treeviewsorted.set_sort_func(2, self.int_compare, 2)
-        self.treeviewsorted.set_sort_func(5, self.int_compare, 5)
-        self.treeviewsorted.set_sort_func(6, self.int_compare, 6)
+        self._ranks = {}
+        self.treeviewfilter = self.store.filter_new()
+        self.treeviewfilter.set_visible_column(self.visible_col)
+        self.treeviewsorted = Gtk.TreeModelSort(model=self.treeviewfilter)
+        for i in self.sort_cols:
+            self.treeviewsorted.set_sort_func(i, self.rank_compare, i)
+
+    def make_ranks(self, journal):
+        # Work out every row's sort position once, so comparisons are lookups
+        self._ranks = {}
+        if not isinstance(journal, articles.journal) or not len(journal):
+            return
+
+        cols = journal.columns()
+        for i, name in self.sort_cols.items():
+            self._ranks[i] = dict(zip(cols.bibcodes, cols.rank(name, descending=True).tolist()))
+
+    def rank_compare(self, model, row1, row2, user_data):
+        ranks = self._ranks.get(user_data)
+        if ranks is not None:
+            try:
+                value1 = ranks[model.get_value(row1, 9)]
+                value2 = ranks[model.get_value(row2, 9)]
+                return (value1 > value2) - (value1 < value2)
+            except KeyError:
+                pass
+        return self.int_compare(model, row1, row2, user_data)
 
     def make_treeview(self):
         # creating the treeview and adding the columns
@@ -158,6 +279,12 @@ class ShowJournal(Gtk.VBox):
         else:
             return 1
 
+    def get_row(self, path):
+        # Convert a treeview path to the row number in self.store and self.journal
+        cp = self.treeviewsorted.convert_path_to_child_path(path)
+        cp = self.treeviewfilter.convert_path_to_child_path(cp)
+        return cp.get_indices()[0]
+
     def tooltip(self, widget, x, y, keyboard, tooltip):
         if not len(self.journal):
             return False
@@ -167,8 +294,7 @@ class ShowJournal(Gtk.VBox):
             return True
         if path is None:
             return False
-        cp = self.treeviewsorted.convert_path_to_child_path(path)
-        row = cp.get_indices()[0] 
+        row = self.get_row(path)
         if len(self.journal):
             tooltip.set_text(self.journal[row].abstract)
             self.treeview.set_tooltip_row(tooltip, path)
@@ -185,8 +311,7 @@ class ShowJournal(Gtk.VBox):
             return False
 
 
-        cp = self.treeviewsorted.convert_path_to_child_path(path)
-        row = cp.get_indices()[0] 
+        row = self.get_row(path)
         article = self.journal[row]
 
         title = col.get_title()
@@ -209,23 +334,27 @@ class ShowJournal(Gtk.VBox):
 
 
     def refresh_results(self, widget):
-        query = widget.get_text().lower()
-        journal = []
-        if len(self._journal) == 0 or len(self.journal) ==0:
-            return
-        
-        for paper in self._journal:
-            if query in paper.title.lower():
-                journal.append(paper)
-            elif query in paper.abstract.lower():
-                journal.append(paper)
-            elif query in paper.authors.lower():
-                journal.append(paper)
-            elif query in paper.year:
-                journal.append(paper)
+        # Wait for the user to stop typing before filtering
+        self._query = widget.get_text().lower()
+        if self._filter_timeout is not None:
+            GLib.source_remove(self._filter_timeout)
+        self._filter_timeout = GLib.timeout_add(self.debounce, self.apply_filter)
+
+    def apply_filter(self):
+        self._filter_timeout = None
+
+        # The index can be ahead of the rows while a download is being shown
+        shown = {i for i in self.index.search(self._query) if i < len(self.journal)}
+
+        # Only touch the rows whose visibility changes
+        for i in self._shown - shown:
+            self.store[i][self.visible_col] = False
+        for i in shown - self._shown:
+            self.store[i][self.visible_col] = True
+        self._shown = shown
 
-        self.make_liststore(journal)
-        utils.show_status('Showing {} out of {}'.format(len(journal),len(self._journal)))
+        utils.show_status('Showing {} out of {}'.format(len(shown),len(self.journal)))
+        return False # Run once
 
 
 class JournalPopupWindow(Gtk.EventBox):
@@ -271,6 +400,12 @@ class JournalPopupWindow(Gtk.EventBox):
         self.button['add_lib'] = Gtk.Button.new_with_label("Add to library")
         vbox.pack_start(self.button['add_lib'], False, True, 0)
 
+        self.button['download'] = Gtk.Button.new_with_label("Download PDFs")
+        vbox.pack_start(self.button['download'], False, True, 0)
+
+        self.button['pause'] = Gtk.Button.new_with_label(self.pause_label())
+        vbox.pack_start(self.button['pause'], False, True, 0)
+
         self.button['save_search'] = Gtk.Button.new_with_label("Save search")
         vbox.pack_start(self.button['save_search'], False, True, 0)
 
@@ -292,6 +427,8 @@ class JournalPopupWindow(Gtk.EventBox):
         self.button['copy_bibtex'].connect("button-press-event", self.bp_bib)
         self.button['add_lib'].connect("button-press-event", self.bp_add_lib)
         self.button['save_search'].connect("button-press-event", self.bp_save_search)
+        self.button['download'].connect("button-press-event", self.bp_download)
+        self.button['pause'].connect("button-press-event", self.bp_pause)
 
         self.button['close'].connect("button-press-event", self.bp_close)
 
@@ -322,13 +459,37 @@ class JournalPopupWindow(Gtk.EventBox):
 
     def bp_bib(self, widget, event):
         utils.clipboard(self.data.bibtex())
-        utils.show_status('Bibtex downloaded for {}'.format(self.data.bibcode))
+        utils.show_status('Bibtex downloaded for {} articles'.format(len(self.data)))
         return True
 
     def bp_add_lib(self, widget, event):
         libraries.Add2Lib(self.data.bibcodes())
         return True
 
+    def bp_download(self, widget, event):
+        # Runs in the background, opening a PDF still works straight away
+        def threader():
+            num = prefetcher.add(self.data)
+            GLib.idle_add(utils.show_status, 'Downloading {} PDFs'.format(num))
+
+        thread = threading.Thread(target=threader)
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def pause_label(self):
+        if prefetcher.paused:
+            return "Resume downloads"
+        return "Pause downloads"
+
+    def bp_pause(self, widget, event):
+        if prefetcher.paused:
+            prefetcher.resume()
+        else:
+            prefetcher.pause()
+        self.button['pause'].set_label(self.pause_label())
+        return True
+
     def bp_close(self, widget, event):
         self.on_tab_close(widget)
 
@@ -106,8 +106,9 @@ class LeftPanel(object):
                 # Must be an item with sub items
                 if row == self.rows['Libraries']['idx']:
                     def func():
-                        bibcodes = adsData.libraries[child].keys()
-                        return adsSearch.bibcode_multi(bibcodes)
+                        # Start showing articles before the whole library has downloaded
+                        pages = adsData.libraries[child].stream()
+                        return adsSearch.bibcode_stream(pages)
                     target = func
                 elif self.rows['Journals']['idx']:
                     def func():
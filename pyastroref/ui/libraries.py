@@ -8,11 +8,18 @@ import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import GLib, Gtk, GObject, Gdk
 
+from . import utils
 from ..papers import adsabs as ads
 
 adsData = ads.adsabs()
 
 
+def _write_error(error):
+    GLib.idle_add(utils.show_status, 'ADS did not accept a library change: {}'.format(error))
+
+adsData.writes.on_error = _write_error
+
+
 class Add2Lib(Gtk.Window):
     def __init__(self, bibcodes=[]):
         Gtk.Window.__init__(self, title="Add to library")
@@ -47,12 +54,9 @@ class Add2Lib(Gtk.Window):
     def on_save(self, button):
         lib = self.combo.get_active_text()
         if lib is not None and len(self.bibcodes):
-            def target():
-                adsData.libraries[lib].add(self.bibcodes)
-
-            thread = threading.Thread(target=target)
-            thread.daemon = True
-            thread.start()  
+            # Queued, ADS is told in the background
+            adsData.libraries[lib].add(self.bibcodes)
+            utils.show_status('Added {} articles to {}'.format(len(self.bibcodes), lib))
 
         self.destroy()
 
@@ -28,6 +28,8 @@ class MainWindow(Gtk.Window):
         utils.set_dm()
 
         self.connect("destroy", Gtk.main_quit)
+        # Pick up settings changed outside the program (ie the ads package's dev_key)
+        self.connect("focus-in-event", lambda *args: ads.utils.config.reload())
         self.set_hide_titlebar_when_maximized(False)
         self.set_position(Gtk.WindowPosition.CENTER)
         self.maximize()
@@ -43,6 +45,18 @@ class MainWindow(Gtk.Window):
 
         self.show_all()
 
+        self.scrub_pdfs()
+
+    def scrub_pdfs(self):
+        # Look for broken or duplicate PDFs without holding up start up
+        def threader():
+            if adsData.pdffolder is not None:
+                adsData.pdfs.scrub()
+
+        thread = threading.Thread(target=threader)
+        thread.daemon = True
+        thread.start()
+
 
     def setup_headerbar(self):
         self.options_menu()
@@ -55,6 +69,7 @@ class MainWindow(Gtk.Window):
         hb.pack_end(self.button_opt)
 
         hb.pack_start(self.search)
+        hb.pack_start(self.offline_mode)
 
 
     def on_click_load_options(self, button):
@@ -77,6 +92,9 @@ class MainWindow(Gtk.Window):
         self.set_default(self.search)
         self.search.set_hexpand(True)
 
+        self.offline_mode = Gtk.ToggleButton(label='Offline')
+        self.offline_mode.set_tooltip_text('Only search papers seen before, without using the ADS quota')
+
     def on_click_search(self, button):
         query = self.search.get_text()
 
@@ -90,9 +108,23 @@ class MainWindow(Gtk.Window):
             q = query
 
         def target():
-            return adsSearch.search(q)
+            return adsSearch.stream(q)
 
-        journal.ShowJournal(target,self.right_panel,query)
+        def offline():
+            return adsSearch.local(q)
+
+        def local_only():
+            result = offline()
+            if result is None:
+                GLib.idle_add(utils.show_status, 'Offline search can not answer that query')
+                return []
+            return result
+
+        if self.offline_mode.get_active():
+            journal.ShowJournal(local_only,self.right_panel,query)
+        else:
+            # Cached matches show straight away while ADS is asked
+            journal.ShowJournal(target,self.right_panel,query,offline=offline)
 
     def setup_panels(self):
         self.panels = Gtk.HPaned()
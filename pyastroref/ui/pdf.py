@@ -17,6 +17,7 @@ from . import journal
 from . import libraries
 
 from ..pdf import pdfWindow
+from ..papers import aio
 
 EvinceDocument.init()
 
@@ -39,27 +40,28 @@ class ShowPDF(Gtk.VBox):
 
         self.add_page()
 
-        utils.thread(self.download_and_show)
+        self.download_and_show()
 
 
     def download_and_show(self):
-        GLib.idle_add(self.header.spin_on)
-        try:
-            self.data.pdf(self._filename)
-        except Exception:
-            pass
-
+        self.header.spin_on()
+        utils.run_async(aio.client(self.data.adsdata).pdf(self.data, self._filename),
+                        callback=self.show, error=self.show)
+
+    def show(self, result=None):
+        self.header.spin_off()
+        if isinstance(result, str):
+            # May be a copy we allready had under another bibcode
+            self._filename = result
         if not os.path.exists(self._filename):
-            GLib.idle_add(self.header.spin_off)
             utils.file_error_window(self.data.bibcode)
-            return 
+            return False
 
         self.pdf = pdfWindow.pdfWin(self._filename)
 
-        GLib.idle_add(self.add,self.pdf)
-        GLib.idle_add(self.header.spin_off)
+        self.add(self.pdf)
         self.header.pdf = self.pdf
-        return
+        return False
 
     def add_page(self):
         for p in range(self.notebook.get_n_pages()):
@@ -232,7 +234,7 @@ class PDFPopupWindow(Gtk.EventBox):
         self.on_tab_close(widget)
 
     def bp_del(self, widget, event):
-        os.remove(self.data.filename(True))
+        self.data.adsdata.pdfs.remove(self.page._filename)
         self.on_tab_close(widget)
 
     def bp_print(self, widget, event):
@@ -11,6 +11,7 @@ gi.require_version("Gtk", "3.0")
 from gi.repository import GLib, Gtk, GObject, Gdk, Gio
 
 from ..papers import utils
+from ..papers import aio
 
 _statusbar = Gtk.Statusbar()
 
@@ -65,7 +66,7 @@ def file_error_window(bibcode):
 
 def set_dm(mode=None):
     if mode is None:
-        mode = utils.read_key_file(utils.settings['DARK_MODE_FILE'])
+        mode = utils.config.get('DARK_MODE_FILE')
         if mode == 'False':
             mode = False
         else:
@@ -73,7 +74,7 @@ def set_dm(mode=None):
 
     settings = Gtk.Settings.get_default()
     settings.set_property("gtk-application-prefer-dark-theme",mode)
-    utils.save_key_file(utils.settings['DARK_MODE_FILE'], mode)
+    utils.config.set('DARK_MODE_FILE', mode)
 
 def get_dm():
     settings = Gtk.Settings.get_default()
@@ -86,6 +87,27 @@ def thread(function,*args):
     thread.start()
 
 
+def run_async(coro, callback=None, error=None):
+    '''
+    Runs the coroutine coro on the shared asyncio loop (papers.aio.loop())
+    then calls callback(result), or error(exception), from the GLib main loop
+    '''
+    future = aio.submit(coro)
+
+    def done(future):
+        try:
+            result = future.result()
+        except Exception as e:
+            if error is not None:
+                GLib.idle_add(error, e)
+            return
+        if callback is not None:
+            GLib.idle_add(callback, result)
+
+    future.add_done_callback(done)
+    return future
+
+
 def save_as(filename, save_func):
     save_dialog = Gtk.FileChooserDialog(title="Save as", transient_for=None,
                                         action=Gtk.FileChooserAction.SAVE)
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import re
+import json as _json
+
+import pytest
+
+from pyastroref.papers import adsabs, planner, utils, writes
+
+
+class FakeResponse(object):
+    def __init__(self, data=None, status_code=200, headers=None, url='', content=b''):
+        self._data = data
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.url = url
+        self.content = content if data is None else _json.dumps(data).encode()
+        self.is_redirect = False
+
+    def json(self):
+        if self._data is None:
+            raise ValueError('No JSON')
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(str(self.status_code), response=self)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i+chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeSession(object):
+    '''
+    Stands in for utils.ADSSession, handler(method, url, **kwargs) returns a FakeResponse
+    '''
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return self.handler(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+@pytest.fixture
+def adsdata(tmp_path, monkeypatch):
+    '''
+    An adsabs whose shared state (cache, snapshots, write queue etc) lives
+    in tmp_path, set adsabs._session to a FakeSession to answer requests
+    '''
+    for key in utils.settings:
+        monkeypatch.setitem(utils.settings, key, str(tmp_path / key.lower()))
+    monkeypatch.setattr(utils.config, '_values', {'TOKEN_FILE': 'token'})
+    monkeypatch.setattr(utils.config, '_mtimes', {})
+
+    for name in ['_session', '_cache', '_graph', '_offline', '_pdfs', '_snapshots', '_writes']:
+        monkeypatch.setattr(adsabs, name, None)
+    monkeypatch.setattr(adsabs, '_inflight', utils.SingleFlight())
+    monkeypatch.setattr(adsabs, '_limits', adsabs.ratelimit.governor())
+
+    data = adsabs.adsabs()
+    # Tests send library changes themselves with flush()
+    monkeypatch.setattr(adsabs, '_writes', writes.queue(data, delay=3600))
+    return data
+
+
+class FakeADS(object):
+    '''
+    Answers bibcode and identifier searches from docs, a list of ADS docs
+    '''
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.queries = []
+
+    def _match(self, kind, value):
+        for doc in self.docs:
+            if kind == 'bibcode':
+                ids = [doc['bibcode']] + list(doc.get('alternate_bibcode', []))
+            else:
+                # ADS matches identifiers with or without arXiv: and case
+                ids = [planner.normalize(i) for i in doc.get('identifier', [])]
+                value = planner.normalize(value)
+            if value in ids:
+                yield doc
+
+    def __call__(self, method, url, params=None, **kwargs):
+        query = params['q']
+        self.queries.append(query)
+        found = []
+        for kind, value in re.findall(r'(bibcode|identifier):"?([^\s"]+)"?', query):
+            for doc in self._match(kind, value):
+                if doc not in found:
+                    found.append(doc)
+
+        fields = params['fl']
+        docs = [{k: v for k, v in i.items() if k in fields} for i in found]
+        start = params.get('start', 0)
+        return FakeResponse({'response': {'numFound': len(docs),
+                                          'docs': docs[start:start+params['rows']]}},
+                            url=url)
+
+
+def make_doc(bibcode, **kwargs):
+    doc = {'bibcode': bibcode, 'title': ['Title of ' + bibcode], 'author': ['Smith, A.'],
+           'year': bibcode[:4], 'bibstem': [bibcode[4:9].strip('.')], 'citation_count': 0,
+           '[citations]': {'num_references': 0, 'num_citations': 0},
+           'abstract': 'About ' + bibcode, 'identifier': [bibcode]}
+    doc.update(kwargs)
+    return doc
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import asyncio
+
+from pyastroref.papers import adsabs, aio, articles
+
+from conftest import FakeADS, FakeSession, make_doc
+
+_bibcodes = ['2020ApJ...900....%dA' % i for i in range(1, 4)]
+
+
+def test_async_matches_sync(adsdata):
+    server = FakeADS([make_doc(i) for i in _bibcodes])
+    adsabs._session = FakeSession(server)
+
+    sync = articles.search(adsdata).bibcode_multi(_bibcodes)
+    queries = len(server.queries)
+    result = asyncio.run(aio.client(adsdata).bibcode_multi(_bibcodes))
+
+    assert result.bibcodes() == sync.bibcodes() == _bibcodes
+    # Answered from the cache the sync call filled
+    assert len(server.queries) == queries
+
+
+def test_async_search(adsdata):
+    server = FakeADS([make_doc(_bibcodes[0])])
+    adsabs._session = FakeSession(server)
+
+    result = asyncio.run(aio.client(adsdata).search('bibcode:' + _bibcodes[0]))
+    assert result.bibcodes() == _bibcodes[:1]
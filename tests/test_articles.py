@@ -0,0 +1,70 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from pyastroref.papers import adsabs, articles
+
+from conftest import FakeADS, FakeSession, make_doc
+
+_a = '2020ApJ...900....1A'
+_b = '2020ApJ...900....2B'
+_alias = '2020arXiv200100001C'
+_canonical = '2020MNRAS.500....3C'
+_gone = '2020ApJ...900....9Z'
+
+
+def test_iteration_skips_missing_and_maps_aliases(adsdata):
+    server = FakeADS([make_doc(_a), make_doc(_canonical, alternate_bibcode=[_alias])])
+    adsabs._session = FakeSession(server)
+
+    j = articles.journal(adsdata, [_a, _alias, _gone])
+    titles = [i.title for i in j]
+
+    assert titles == ['Title of ' + _a, 'Title of ' + _canonical]
+    assert _gone not in j
+    assert len(j) == 2
+
+
+def test_lazy_field_not_marked_when_missing(adsdata):
+    docs = [make_doc(_a, reference=[_b]), make_doc(_b, reference=[_a])]
+    server = FakeADS([])
+    adsabs._session = FakeSession(server)
+
+    # Rows as a search would give us, without references
+    j = articles.journal(adsdata, [_a, _b], data=[make_doc(_a), make_doc(_b)])
+    first, second = list(j)
+
+    # ADS does not answer for the second article this time
+    server.docs = docs[:1]
+    assert first['reference'] == [_b]
+    assert not second.has(['reference'])
+
+    # so it is asked for again rather than being stuck empty
+    server.docs = docs
+    assert second['reference'] == [_a]
+
+
+def test_fetch_uses_cache(adsdata):
+    server = FakeADS([make_doc(_a)])
+    adsabs._session = FakeSession(server)
+
+    s = articles.search(adsdata)
+    assert _a in s.fetch([_a])
+    assert _a in s.fetch([_a])
+    assert len(server.queries) == 1
+
+
+def test_pdf_found_under_alternate_bibcode(adsdata, tmp_path):
+    folder = tmp_path / 'pdfs'
+    folder.mkdir()
+    adsdata.pdffolder = str(folder)
+    path = folder / (_alias + '.pdf')
+    path.write_bytes(b'%PDF-1.4\n%%EOF\n')
+    adsdata.pdfs.add(str(path), [_alias])
+
+    server = FakeADS([make_doc(_canonical, alternate_bibcode=[_alias])])
+    adsabs._session = FakeSession(server)
+
+    # As a row of search results
+    s = articles.search(adsdata)
+    _, docs = s._query('bibcode:' + _canonical)
+    paper = articles.article(adsdata, data=docs[0], fields=s.fields)
+    assert paper.filename(True) == str(path)
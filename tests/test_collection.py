@@ -0,0 +1,32 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from pyastroref.papers import collection
+
+_journals = {
+    'The Astrophysical Journal': 'ApJ',
+    'The Astrophysical Journal Supplement Series': 'ApJS',
+    'Astronomy and Astrophysics': 'A&A',
+    'Nature': 'Natur',
+    'Nature Astronomy': 'NatAs',
+}
+
+
+def test_prefix_matches_name_word_and_bibstem():
+    index = collection.index(_journals)
+    assert index.find('apj') == ['The Astrophysical Journal', 'The Astrophysical Journal Supplement Series']
+    assert index.find('astrophysical journal s') == ['The Astrophysical Journal Supplement Series']
+    assert index.find('NAT') == ['Nature', 'Nature Astronomy']
+    assert index.find('zzz') == []
+
+
+def test_substring_mode():
+    index = collection.index(_journals)
+    assert index.find('phys', substring=True) == ['Astronomy and Astrophysics',
+                                                  'The Astrophysical Journal',
+                                                  'The Astrophysical Journal Supplement Series']
+    assert index.find('phys') == []
+
+
+def test_empty_query_lists_everything():
+    index = collection.index(_journals)
+    assert index.find('  ') == sorted(_journals, key=str.lower)
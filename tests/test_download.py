@@ -0,0 +1,96 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import requests
+
+from pyastroref.papers import download
+
+from conftest import FakeResponse, FakeSession
+
+_pdf = b'%PDF-1.4\n' + b'x' * 5000 + b'\n%%EOF\n'
+_url = 'https://example.org/paper.pdf'
+
+
+class dropping(FakeResponse):
+    '''
+    Sends the first cut bytes then loses the connection
+    '''
+    def __init__(self, content, cut, **kwargs):
+        super().__init__(content=content, **kwargs)
+        self.cut = cut
+
+    def iter_content(self, chunk_size=1):
+        yield self.content[:self.cut]
+        raise requests.exceptions.ChunkedEncodingError('Connection dropped')
+
+
+class server(object):
+    def __init__(self, content, drop_at=None, ranges=True, content_type='application/pdf'):
+        self.content = content
+        self.drop_at = drop_at
+        self.ranges = ranges
+        self.content_type = content_type
+        self.requests = []
+
+    def __call__(self, method, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.requests.append(headers.get('Range'))
+        start = 0
+        status = 200
+        extra = {'Content-Type': self.content_type}
+        if 'Range' in headers and self.ranges:
+            start = int(headers['Range'].split('=')[1].rstrip('-'))
+            status = 206
+            extra['Content-Range'] = 'bytes {}-{}/{}'.format(start, len(self.content)-1, len(self.content))
+        body = self.content[start:]
+        extra['Content-Length'] = str(len(body))
+
+        if self.drop_at is not None:
+            cut, self.drop_at = self.drop_at, None
+            return dropping(body, cut, status_code=status, headers=extra, url=url)
+        return FakeResponse(content=body, status_code=status, headers=extra, url=url)
+
+
+def test_resumes_with_range(tmp_path):
+    s = server(_pdf, drop_at=1000)
+    d = download.downloader(FakeSession(s), chunk_size=256)
+    filename = str(tmp_path / 'paper.pdf')
+
+    assert d.fetch(_url, filename)
+    assert open(filename, 'rb').read() == _pdf
+    assert s.requests == [None, 'bytes=1000-']
+    assert not (tmp_path / 'paper.pdf.part').exists()
+
+
+def test_restarts_if_range_ignored(tmp_path):
+    s = server(_pdf, drop_at=1000, ranges=False)
+    d = download.downloader(FakeSession(s), chunk_size=256)
+    filename = str(tmp_path / 'paper.pdf')
+
+    assert d.fetch(_url, filename)
+    assert open(filename, 'rb').read() == _pdf
+
+
+def test_login_page_is_not_a_pdf(tmp_path):
+    s = server(b'<html>Please log in</html>', content_type='text/html')
+    d = download.downloader(FakeSession(s))
+    filename = str(tmp_path / 'paper.pdf')
+
+    assert not d.fetch(_url, filename)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_redirect_loop_fails_this_source(tmp_path):
+    def loop(method, url, **kwargs):
+        raise requests.TooManyRedirects('loop')
+    d = download.downloader(FakeSession(loop))
+    assert not d.fetch(_url, str(tmp_path / 'paper.pdf'))
+
+
+def test_is_pdf(tmp_path):
+    good = tmp_path / 'good.pdf'
+    good.write_bytes(_pdf)
+    cut = tmp_path / 'cut.pdf'
+    cut.write_bytes(_pdf[:2000])
+    assert download.is_pdf(str(good))
+    assert not download.is_pdf(str(cut))
+    assert not download.is_pdf(str(tmp_path / 'missing.pdf'))
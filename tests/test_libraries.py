@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from pyastroref.papers import adsabs
+
+from conftest import FakeResponse, FakeSession
+
+
+class remote(object):
+    '''
+    One ADS library held "server side"
+    '''
+    def __init__(self, documents):
+        self.documents = list(documents)
+        self.modified = 1
+        self.reads = 0
+
+    def metadata(self):
+        return {'id': 'lib1', 'name': 'Lib', 'description': '',
+                'num_documents': len(self.documents),
+                'date_last_modified': str(self.modified)}
+
+    def change(self, documents):
+        self.documents = list(documents)
+        self.modified += 1
+
+    def __call__(self, method, url, params=None, **kwargs):
+        if url.endswith('/libraries'):
+            return FakeResponse({'libraries': [self.metadata()]})
+        params = params or {}
+        start = params.get('start', 0)
+        rows = params.get('rows', 20)
+        if rows > 1:
+            self.reads += 1
+        return FakeResponse({'metadata': self.metadata(),
+                             'documents': self.documents[start:start+rows]})
+
+
+def test_library_loads_once(adsdata):
+    server = remote(['A', 'B'])
+    adsabs._session = FakeSession(server)
+
+    lib = adsdata.libraries['Lib']
+    assert list(lib._documents()) == ['A', 'B']
+    assert 'A' in lib
+    assert server.reads == 1
+
+
+def test_library_resyncs_when_changed_remotely(adsdata):
+    server = remote(['A', 'B'])
+    adsabs._session = FakeSession(server)
+
+    lib = adsdata.libraries['Lib']
+    assert len(lib) == 2
+
+    server.change(['A', 'B', 'C'])
+    adsdata.libraries.update()
+
+    assert adsdata.libraries['Lib'] is lib
+    assert len(lib) == 3
+    assert 'C' in lib
+    assert [i for _, page in lib.stream() for i in page] == ['A', 'B', 'C']
+
+
+def test_library_unchanged_is_not_downloaded_again(adsdata):
+    server = remote(['A', 'B'])
+    adsabs._session = FakeSession(server)
+
+    lib = adsdata.libraries['Lib']
+    assert len(lib) == 2
+    adsdata.libraries.update()
+    assert len(lib) == 2
+    assert server.reads == 1
+
+
+def test_snapshot_used_by_new_objects(adsdata):
+    server = remote(['A', 'B'])
+    adsabs._session = FakeSession(server)
+
+    assert len(adsdata.libraries['Lib']) == 2
+    adsdata.libraries.invalidate('lib1')
+    assert len(adsdata.libraries['Lib']) == 2
+    assert server.reads == 1
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import pytest
+
+from pyastroref.papers import adsabs, articles
+
+from conftest import FakeADS, FakeSession, make_doc
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('went to the network')
+    monkeypatch.setattr('requests.get', fail)
+    adsabs._session = FakeSession(fail)
+
+
+def test_local_search_finds_cached(adsdata):
+    adsabs._session = FakeSession(FakeADS([make_doc('2020ApJ...900....1A', title=['Dark matter halos'])]))
+    s = articles.search(adsdata)
+    s._query('bibcode:2020ApJ...900....1A')
+
+    adsabs._session = None
+    found = s.local('title:halos')
+    assert found.bibcodes() == ['2020ApJ...900....1A']
+
+
+def test_local_search_never_resolves_urls(adsdata, no_network):
+    s = articles.search(adsdata)
+    assert s.local('https://www.nature.com/articles/s41550-018-0442-z') is None
@@ -0,0 +1,64 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from pyastroref.papers import adsabs, articles, planner
+
+from conftest import FakeADS, FakeSession, make_doc
+
+_a = '2020ApJ...900....1A'
+_b = '2021MNRAS.500....2B'
+
+
+def _docs():
+    return [make_doc(_a, identifier=[_a, 'arXiv:2001.00001', '10.3847/abc']),
+            make_doc(_b, identifier=[_b, 'arXiv:2102.00002'])]
+
+
+def test_parse():
+    assert planner.parse('bibcode:' + _a) == [('bibcode', _a)]
+    assert planner.parse('arxiv:2001.00001 OR doi:10.3847/abc') == [('identifier', '2001.00001'),
+                                                                     ('identifier', '10.3847/abc')]
+    assert planner.parse(_a + ', 2001.00001v2') == [('bibcode', _a), ('identifier', '2001.00001v2')]
+    assert planner.parse('author:"Smith"') is None
+    assert planner.parse('') is None
+
+
+def test_normalize():
+    assert planner.normalize('arXiv:2001.00001v3') == '2001.00001'
+    assert planner.normalize('"10.3847/ABC"') == '10.3847/abc'
+
+
+def test_cached_bibcodes_need_no_query(adsdata):
+    server = FakeADS(_docs())
+    adsabs._session = FakeSession(server)
+    s = articles.search(adsdata)
+
+    assert s.search('bibcode:{} OR bibcode:{}'.format(_a, _b)).bibcodes() == [_a, _b]
+    queries = len(server.queries)
+
+    assert s.search('bibcode:{} OR bibcode:{}'.format(_b, _a)).bibcodes() == [_b, _a]
+    assert len(server.queries) == queries
+
+
+def test_cached_identifiers_resolve_locally(adsdata):
+    server = FakeADS(_docs())
+    adsabs._session = FakeSession(server)
+    s = articles.search(adsdata)
+
+    assert s.search('arxiv:2001.00001').bibcodes() == [_a]
+    queries = len(server.queries)
+
+    assert s.search('arXiv:2001.00001v2 OR doi:10.3847/ABC').bibcodes() == [_a]
+    assert len(server.queries) == queries
+
+
+def test_only_misses_go_to_ads(adsdata):
+    server = FakeADS(_docs())
+    adsabs._session = FakeSession(server)
+    s = articles.search(adsdata)
+
+    s.search('bibcode:' + _a)
+    server.queries.clear()
+
+    assert s.search('bibcode:{} OR arxiv:2102.00002'.format(_a)).bibcodes() == [_a, _b]
+    assert len(server.queries) == 1
+    assert _a not in server.queries[0]
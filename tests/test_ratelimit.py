@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import time
+
+import pytest
+
+from pyastroref.papers import ratelimit, utils
+
+from conftest import FakeResponse
+
+_api = 'https://api.adsabs.harvard.edu/v1/search/query'
+_gateway = 'https://ui.adsabs.harvard.edu/link_gateway/2020ApJ...900....1A/PUB_PDF'
+
+
+def test_only_api_counts():
+    assert ratelimit.counts(_api)
+    assert not ratelimit.counts(_gateway)
+    assert not ratelimit.counts('https://arxiv.org/pdf/2001.00001')
+    assert not ratelimit.counts('http://adsabs.harvard.edu/abs_doc/journals1.html')
+
+
+def test_other_hosts_dont_change_quota():
+    g = ratelimit.governor()
+    g.update(FakeResponse(status_code=429, url='https://arxiv.org/pdf/1',
+                          headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Limit': '10'}))
+    assert g.remaining == g.limit == ratelimit._max_limit
+    assert g.delay(background=False) == 0
+
+
+def test_api_headers_recorded():
+    g = ratelimit.governor()
+    g.update(FakeResponse(url=_api, headers={'X-RateLimit-Remaining': '42',
+                                             'X-RateLimit-Limit': '100',
+                                             'X-RateLimit-Reset': str(time.time() + 60)}))
+    assert g.remaining == 42
+    assert g.limit == 100
+
+
+def test_429_without_reset_recovers():
+    g = ratelimit.governor()
+    g.update(FakeResponse(status_code=429, url=_api, headers={'Retry-After': '30'}))
+    with pytest.raises(utils.RateLimitError):
+        g.delay(background=False)
+    assert g.reset is not None
+
+    g._reset = time.time() - 1
+    assert g.delay(background=False) == 0
+
+
+def test_session_only_waits_for_api(monkeypatch):
+    g = ratelimit.governor()
+    g.remaining = 0
+    g._reset = time.time() + 60
+    session = utils.ADSSession(limits=g)
+    sent = []
+    monkeypatch.setattr('requests.Session.request',
+                        lambda self, method, url, **kwargs: sent.append(url))
+
+    session.get(_gateway)
+    assert sent == [_gateway]
+    with pytest.raises(utils.RateLimitError):
+        session.get(_api)
@@ -0,0 +1,35 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from pyastroref.papers import textindex
+
+
+class paper(object):
+    def __init__(self, title, abstract=None, authors='Smith, A.', year='2020'):
+        self.title = title
+        self.authors = authors
+        self.year = year
+        self._abstract = abstract
+
+    def peek(self, key, default=None):
+        return self._abstract if key == 'abstract' else default
+
+
+def test_search_matches_substring_scan():
+    papers = [paper('Dark matter halos', 'Simulations of galaxies'),
+              paper('Stellar winds', None),
+              paper('Galaxy mergers', 'Dark energy and halos')]
+    index = textindex.textindex()
+    assert index.add(papers) == [0, 1, 2]
+
+    for query in ['dark', 'halos', 'galax', 'wi', 'smith', 'nothing', '']:
+        expected = [i for i, p in enumerate(papers)
+                    if query in '\n'.join([p.title, p._abstract or '', p.authors, p.year]).lower()]
+        assert index.search(query) == expected
+
+
+def test_narrowing_sees_papers_added_since():
+    index = textindex.textindex()
+    index.add([paper('Dark matter')])
+    assert index.search('dar') == [0]
+    index.add([paper('Dark energy')])
+    assert index.search('dark') == [0, 1]
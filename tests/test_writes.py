@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from pyastroref.papers import adsabs
+
+from conftest import FakeResponse, FakeSession
+from test_libraries import remote
+
+
+class server(remote):
+    '''
+    A remote library that answers posts with status (and body)
+    '''
+    def __init__(self, documents, status=200, body=None):
+        super().__init__(documents)
+        self.status = status
+        self.body = body
+        self.posts = []
+
+    def __call__(self, method, url, params=None, json=None, **kwargs):
+        if method != 'POST':
+            return super().__call__(method, url, params=params, **kwargs)
+        self.posts.append(json)
+        if self.status == 200 and self.body is None:
+            bibcodes = json['bibcode']
+            if json['action'] == 'add':
+                self.change(self.documents + [i for i in bibcodes if i not in self.documents])
+                return FakeResponse({'number_added': len(bibcodes)})
+            self.change([i for i in self.documents if i not in bibcodes])
+            return FakeResponse({'number_removed': len(bibcodes)})
+        return FakeResponse(self.body, status_code=self.status)
+
+
+def test_add_shows_locally_and_is_sent(adsdata):
+    ads = server(['A'])
+    adsabs._session = FakeSession(ads)
+    lib = adsdata.libraries['Lib']
+
+    lib.add(['B'])
+    assert 'B' in lib
+    assert not len(ads.posts)
+
+    assert adsdata.writes.flush()
+    assert ads.documents == ['A', 'B']
+    assert adsdata.writes.pending() == []
+
+
+def test_rate_limited_changes_stay_queued(adsdata):
+    ads = server(['A'], status=429, body={'error': 'rate limited'})
+    adsabs._session = FakeSession(ads)
+    lib = adsdata.libraries['Lib']
+
+    lib.add(['B'])
+    assert not adsdata.writes.flush()
+    assert len(adsdata.writes.pending()) == 1
+
+    ads.status, ads.body = 502, None
+    assert not adsdata.writes.flush()
+    assert len(adsdata.writes.pending()) == 1
+
+
+def test_rejected_change_is_undone(adsdata):
+    ads = server(['A'], status=400, body={'error': 'no such bibcode'})
+    adsabs._session = FakeSession(ads)
+    errors = []
+    adsdata.writes.on_error = errors.append
+    lib = adsdata.libraries['Lib']
+
+    lib.add(['B'])
+    lib.remove(['A'])
+    assert 'B' in lib
+    assert 'A' not in lib
+
+    assert adsdata.writes.flush()
+    assert len(errors) == 1
+    assert adsdata.writes.pending() == []
+    assert 'B' not in lib
+    assert 'A' in lib
+    assert adsdata.snapshots.get('lib1')[1] == ['A']